@@ -25,6 +25,12 @@ function AddArticle(){
         .then(r => {
             if (r.ok) {
                 return r.json().then(data => {
+                    // 200 means the story was already posted; send the user to it instead
+                    if (r.status === 200) {
+                        alert("This article has already been posted!");
+                        navigate(`/article/${data.id}`)
+                        return;
+                    }
                     alert("Successfully posted a new article!");
                     console.log("Created article:", data);
                     navigate("/?sort=new")
@@ -84,17 +84,17 @@ function ArticlePage() {
                         ...new Set(data.comments.map(comment => comment.user_id).filter(Boolean))
                     ];
 
-                    const userFetches = await Promise.all(
-                        uniqueUserIds.map(uid =>
-                            fetch(`/user/${uid}`)
-                                .then(resp => resp.json())
-                                .then(userData => ({ [uid]: userData }))
-                                .catch(() => ({ [uid]: null })) // In case fetch fails
-                        )
+                    // One lookup for every commenter on the page
+                    let users = [];
+                    if (uniqueUserIds.length > 0) {
+                        users = await fetch(`/users?ids=${uniqueUserIds.join(',')}`)
+                            .then(resp => resp.json())
+                            .catch(() => []); // In case fetch fails
+                    }
+
+                    const mergedUserMap = Object.fromEntries(
+                        (Array.isArray(users) ? users : []).map(userData => [userData.id, userData])
                     );
-
-                    // Merge all objects into one map
-                    const mergedUserMap = Object.assign({}, ...userFetches);
                     setUserMap(mergedUserMap);
                 } else {
                     console.error("Error: Data is not in expected format", data);
@@ -113,23 +113,21 @@ function ArticlePage() {
         async function getVotes() {
             if (!article) return;
     
-            const endpoints = [
-                { type: "Article", id: article.id },
-                ...article.fact_checks.map(fc => ({ type: "FactCheck", id: fc.id })),
-                ...article.comments.map(c => ({ type: "Comment", id: c.id })),
+            const keys = [
+                `Article-${article.id}`,
+                ...article.fact_checks.map(fc => `FactCheck-${fc.id}`),
+                ...article.comments.map(c => `Comment-${c.id}`),
             ];
     
-            const fetches = await Promise.all(
-                endpoints.map(({ type, id }) =>
-                    fetch(`/votes/${type}/${id}`)
-                        .then(res => res.json())
-                        .then(data => ({ [`${type}-${id}`]: data }))
-                        .catch(() => ({ [`${type}-${id}`]: { likes: 0, dislikes: 0 } }))
-                )
-            );
-    
-            const mergedVotes = Object.assign({}, ...fetches);
-            setVotesMap(mergedVotes);
+            // One request for every tally on the page, including the user's own votes
+            try {
+                const response = await fetch(`/votes?items=${keys.join(',')}`);
+                if (!response.ok) throw new Error(`status ${response.status}`);
+                setVotesMap(await response.json());
+            } catch (error) {
+                console.error("Error fetching votes:", error);
+                setVotesMap(Object.fromEntries(keys.map(key => [key, { likes: 0, dislikes: 0 }])));
+            }
         }
     
         getVotes();
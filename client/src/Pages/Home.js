@@ -4,6 +4,8 @@ import { Link, useLocation, useNavigate } from "react-router-dom";
 function Home() {
     const [articles, setArticles] = useState([]);
     const [loading, setLoading] = useState(true);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const location = useLocation();
 
     const formatDate = (dateString) => {
@@ -46,31 +48,55 @@ function Home() {
     };
 
     const currentSort = new URLSearchParams(location.search).get('sort') || 'hot';
+
+    const fetchArticles = async (cursor = null) => {
+        const params = new URLSearchParams({ sort: currentSort });
+        if (cursor) params.set('cursor', cursor);
+
+        const response = await fetch(`/articles?${params}`, {
+            method: "GET"
+        });
+        const data = await response.json();
+
+        if (Array.isArray(data.articles)) {
+            return data;
+        }
+        console.error("Error: Data is not in expected format", data);
+        return { articles: [], next_cursor: null };
+    };
+
     useEffect(() => {
-        const fetchArticles = async () => {
+        const loadFirstPage = async () => {
             setLoading(true);
             try {
-                const response = await fetch(`/articles?sort=${currentSort}`, {
-                    method: "GET"
-                });
-                const data = await response.json();
-    
-                if (Array.isArray(data)) {
-                    setArticles(data);
-                } else {
-                    console.error("Error: Data is not in expected format", data);
-                    setArticles([]);
-                }
+                const data = await fetchArticles();
+                setArticles(data.articles);
+                setNextCursor(data.next_cursor);
             } catch (error) {
                 console.error("Error fetching articles:", error);
                 setArticles([]);
+                setNextCursor(null);
             } finally {
                 setLoading(false);
             }
         };
     
-        fetchArticles();
+        loadFirstPage();
     }, [currentSort]);
+
+    const loadMore = async () => {
+        if (!nextCursor || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const data = await fetchArticles(nextCursor);
+            setArticles(prev => [...prev, ...data.articles]);
+            setNextCursor(data.next_cursor);
+        } catch (error) {
+            console.error("Error fetching more articles:", error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
     
 
     return (
@@ -102,7 +128,7 @@ function Home() {
                                             article.fact_checks?.length > 0
                                             ? article.fact_checks
                                                 .slice() 
-                                                .sort((a, b) => b.hotness - a.hotness)[0].fact_check_level_label
+                                                .sort((a, b) => b.vote_score - a.vote_score)[0].fact_check_level_label
                                             : "Unverified"
                                         }
                                         </h3>
@@ -114,6 +140,11 @@ function Home() {
                     ) : (
                         <li>No articles available.</li>
                     )}
+                    {nextCursor && (
+                        <button className="button-class" onClick={loadMore} disabled={loadingMore}>
+                            {loadingMore ? "Loading..." : "Load more"}
+                        </button>
+                    )}
                 </ul>
             )}
         </div>
@@ -3,20 +3,37 @@
 # Standard library imports
 
 # Remote library imports
-from flask import request, session, make_response, jsonify
+from flask import request, session, make_response, jsonify, stream_with_context
 from flask_restful import Resource
-from datetime import timedelta
-# from server.tasks import update_score
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
 
 # Local imports
 from config import app, db, api
 # Add your model imports
-from models import Article, User, Comment, FactCheck, Vote
-
+from models import Article, User, Comment, FactCheck, Vote, VOTABLE_MODELS, DATETIME_FORMAT, rebuild_vote_counts
+from pagination import encode_cursor, decode_cursor, get_page_size
+from serializers import serialize, serialize_many, loader_options
+from cache import feed_cache, session_cache
+from conditional import add_validators, not_modified, payload_etag, version_etag, version_timestamp
+from tasks import score_recompute_deferred
+from passwords import PasswordHashingBusy
+from importer import import_articles
+from search import SEARCHABLE, match_expression, search, highlight
+from encoding import stream_list
+from votes import record_vote, projected_vote_counts, after_vote_commit, vote_buffer, write_behind_enabled
+import metrics
+
+import click
+import hmac
 import traceback
 
 # Views go here!
 
+def password_busy_response():
+    return {"error": "The server is busy, please try again in a moment."}, 503, {"Retry-After": "1"}
+
+
 class Signup(Resource):
     def post(self):
         data = request.get_json()
@@ -39,6 +56,8 @@ class Signup(Resource):
             db.session.commit()
         except ValueError as ve:
             return {"error": str(ve)}, 400
+        except PasswordHashingBusy:
+            return password_busy_response()
         except Exception as e:
             db.session.rollback()
             print("Server Error:", e)  # Make sure this prints!
@@ -52,18 +71,31 @@ class Signup(Resource):
             app.permanent_session_lifetime = timedelta(days=30)
         session["user_id"] = user.id
 
-        return user.to_dict(), 201
+        return session_payload(user), 201
 
 
 
+def session_payload(user):
+    payload = serialize(user, 'detail')
+    session_cache.set(payload, user.id)
+    return payload
+
+
 class CheckSession(Resource):
     def get(self):
-        user = db.session.get(User, session.get('user_id'))
-        if user:
-            return make_response(user.to_dict(), 200)
-        else:
+        user_id = session.get('user_id')
+        if user_id is None:
             return {"error": "Unauthorized"}, 401
 
+        # Every page load lands here, so in steady state it's answered from the cache
+        payload = session_cache.get(user_id)
+        if payload is None:
+            user = db.session.get(User, user_id)
+            if not user:
+                return {"error": "Unauthorized"}, 401
+            payload = session_payload(user)
+        return make_response(payload, 200)
+
 class Login(Resource):
     def post(self):
         data = request.get_json()
@@ -74,12 +106,24 @@ class Login(Resource):
         query = db.select(User).where(User.username == username)
         user = db.session.execute(query).scalar_one_or_none()
 
-        if user and user.check_password(password):
+        try:
+            authenticated = user is not None and user.check_password(password)
+        except PasswordHashingBusy:
+            return password_busy_response()
+
+        if authenticated:
+            # Bring hashes made at an older BCRYPT_LOG_ROUNDS up to the current cost
+            try:
+                if user.upgrade_password_hash(password):
+                    db.session.commit()
+            except PasswordHashingBusy:
+                # The password checked out; the rehash can wait for the next login
+                pass
             session.permanent = stay_signed_in
             if stay_signed_in:
                 app.permanent_session_lifetime = timedelta(days=30)
             session['user_id'] = user.id
-            return user.to_dict(), 200
+            return session_payload(user), 200
         
         return {"error": "Invalid username or password"}, 401
 
@@ -91,35 +135,131 @@ class Logout(Resource):
         else:
             return {"error": "Not logged in"}, 401
         
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+# ?stream=1 pages are encoded as they're read, so they can be far larger
+FEED_STREAM_MAX_PAGE_SIZE = 10000
+STREAM_BATCH_SIZE = 500
+
 class Articles(Resource):
     def get(self):
         sort_type = request.args.get('sort', 'hot')
-        try:
-            if sort_type == 'new':
-                articles = db.session.query(Article).order_by(Article.created_at.desc()).all()
-            elif sort_type == 'hot':
-                articles = db.session.query(Article).all()
-                articles = sorted(articles, key=lambda a: a.hotness(), reverse=True)
-            else:
-                return {"error": "unsupported sorting type"}, 400
+        streamed = request.args.get('stream') == '1'
+        limit = get_page_size(
+            request.args, FEED_PAGE_SIZE, FEED_STREAM_MAX_PAGE_SIZE if streamed else FEED_MAX_PAGE_SIZE
+        )
+        cursor = request.args.get('cursor')
+
+        # Keyset pagination: each page resumes strictly after the (key, id) of the previous one
+        if sort_type == 'new':
+            sort_key = Article.created_at
+        elif sort_type == 'hot':
+            sort_key = Article.hot_score
+        else:
+            return {"error": "unsupported sorting type"}, 400
+
+        query = (
+            db.select(Article)
+            .options(*loader_options(Article, 'summary'))
+            .order_by(sort_key.desc(), Article.id.desc())
+        )
+
+        # Cached pages carry the ETag computed when they were built, so a hit that
+        # matches the client's copy answers 304 without touching the database
+        cached = None if streamed else feed_cache.get(sort_type, limit, cursor or '')
+        if cached is not None:
+            return not_modified(cached["etag"]) or add_validators(jsonify(cached["page"]), cached["etag"])
+
+        if cursor:
+            try:
+                cursor_sort, key, last_id = decode_cursor(cursor, 3)
+                if cursor_sort != sort_type:
+                    raise ValueError("Cursor does not match sort type")
+                if sort_type == 'new':
+                    key = datetime.fromisoformat(key)
+            except (ValueError, TypeError):
+                return {"error": "Invalid cursor"}, 400
+            query = query.where(db.tuple_(sort_key, Article.id) < db.tuple_(key, last_id))
+
+        if streamed:
+            return stream_feed(query, limit, sort_type)
 
-            return jsonify([article.to_dict() for article in articles])
+        try:
+            articles = db.session.execute(query.limit(limit + 1)).scalars().all()
+
+            next_cursor = None
+            if len(articles) > limit:
+                articles = articles[:limit]
+                last = articles[-1]
+                key = last.created_at.isoformat() if sort_type == 'new' else last.hot_score
+                next_cursor = encode_cursor(sort_type, key, last.id)
+
+            page = {
+                "articles": serialize_many(articles, 'summary'),
+                "next_cursor": next_cursor
+            }
+            etag = payload_etag(page)
+            feed_cache.set({"etag": etag, "page": page}, sort_type, limit, cursor or '')
+            return not_modified(etag) or add_validators(jsonify(page), etag)
 
         except Exception as e:
             return {"error": str(e)}, 500
 
 
+def stream_feed(query, limit, sort_type):
+    """
+    A feed page written out as the rows arrive, STREAM_BATCH_SIZE at a time, so
+    memory doesn't grow with the page. The body isn't known up front, so there's
+    no ETag and no caching.
+    """
+    rows = db.session.execute(
+        query.limit(limit + 1).execution_options(yield_per=STREAM_BATCH_SIZE)
+    ).scalars()
+    page = {"next_cursor": None}
+
+    def articles():
+        count = 0
+        try:
+            for article in rows:
+                if count == limit:
+                    key = last.created_at.isoformat() if sort_type == 'new' else last.hot_score
+                    page["next_cursor"] = encode_cursor(sort_type, key, last.id)
+                    break
+                yield serialize(article, 'summary')
+                last = article
+                count += 1
+        finally:
+            rows.close()
+
+    body = stream_list("articles", articles(), lambda: page)
+    return app.response_class(stream_with_context(body), mimetype='application/json')
+
+
 class ArticleById(Resource):
     def get(self, id):
         try:
-            # Fetch article by id
-            article = db.session.get(Article, id)
-            
-            if not article:
-                return jsonify({"error": "Article not found"}), 404
+            # activity_at moves whenever anything in the detail payload changes
+            activity_at = db.session.execute(
+                db.select(Article.activity_at).where(Article.id == id)
+            ).first()
+            if not activity_at:
+                return {"error": "Article not found"}, 404
+
+            activity_at = activity_at[0]
+            etag = version_etag('article', id, version_timestamp(activity_at))
+            cached_response = not_modified(etag, activity_at)
+            if cached_response:
+                return cached_response
+
+            # Fetch the article and everything the detail profile reads in a fixed number of queries
+            article = db.session.execute(
+                db.select(Article)
+                .where(Article.id == id)
+                .options(*loader_options(Article, 'detail'))
+            ).unique().scalar_one()
             
             # Return article data in JSON format
-            return jsonify(article.to_dict())
+            return add_validators(jsonify(serialize(article, 'detail')), etag, activity_at)
         
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -154,8 +294,10 @@ class ArticleById(Resource):
                 else:
                     return jsonify({"error": "Invalid url"}, 400)
             
+            Article.touch(Article.id == article.id)
             db.session.commit()
-            return make_response(article.to_dict(), 200)
+            feed_cache.invalidate()
+            return make_response(serialize(article, 'summary'), 200)
         
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -167,37 +309,62 @@ class ArticleById(Resource):
         
         db.session.delete(article)
         db.session.commit()
+        feed_cache.invalidate()
         return make_response("", 204)
     
 class CreateArticle(Resource):
     def post(self):
         try:
-            data = request.get_json()
-            required_fields = ['image_url', 'title', 'url']
-            for field in required_fields:
-                if field not in data or not isinstance(data[field], str) or not data[field].strip():
-                    return jsonify({"error": f"Invalid or missing field: {field}"}), 400
-            
-            if 'submitted_by_id' not in data or not isinstance(data['submitted_by_id'], int):
-                return jsonify({"error": "Invalid or missing field: submitted_by_id"}), 400
+            values, error = Article.validate_submission(request.get_json())
+            if error:
+                return {"error": error}, 400
+
+            # Resubmitting a story returns the article it already has, so votes and fact checks stay in one place
+            existing = Article.find_by_url(values['url'])
+            if existing:
+                return make_response(serialize(existing, 'summary'), 200)
 
-            new_article = Article(image_url = data['image_url'], title = data['title'], url = data['url'], submitted_by_id = data['submitted_by_id'])
+            new_article = Article(**values)
             db.session.add(new_article)
             db.session.commit()
-            return make_response(new_article.to_dict(), 201)
+            feed_cache.invalidate()
+            return make_response(serialize(new_article, 'summary'), 201)
         
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+class ImportArticles(Resource):
+    def post(self):
+        token = app.config['IMPORT_TOKEN']
+        if not token:
+            return {"error": "Bulk import is disabled"}, 403
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {token}".encode('utf-8')):
+            return {"error": "Unauthorized"}, 401
+
+        try:
+            batch_size = int(request.args.get('batch_size', app.config['IMPORT_BATCH_SIZE']))
+        except ValueError:
+            return {"error": "batch_size must be an integer"}, 400
+        if batch_size < 1:
+            return {"error": "batch_size must be positive"}, 400
+
+        # Read the body line by line rather than loading it whole
+        report = import_articles(request.stream, batch_size)
+        return report.to_dict(), 200
+
 class UserById(Resource):
     def get(self, id):
         try:
             user = db.session.get(User, id)
 
             if not user:
-                return jsonify({"error": "User was not found"}), 404
+                return {"error": "User was not found"}, 404
+
+            modified_at = user.updated_at or user.created_at
+            etag = version_etag('user', id, version_timestamp(modified_at))
             
-            return jsonify(user.to_dict())
+            return not_modified(etag, modified_at) or add_validators(jsonify(serialize(user, 'summary')), etag, modified_at)
         
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -219,6 +386,8 @@ class UserById(Resource):
                     return {"error": "That is your current username, silly goose!"}, 400
                 
                 user.username = data['username']
+                # Article pages embed the submitter's username
+                Article.touch(Article.submitted_by_id == user.id)
             
             if "email" in data:
                 existing_email = db.session.query(User).filter(User.email == data['email']).first()
@@ -236,8 +405,11 @@ class UserById(Resource):
                 user.password_hash = data['password']
 
             db.session.commit()
-            return user.to_dict(), 200
+            session_cache.delete(user.id)
+            return serialize(user, 'detail'), 200
 
+        except PasswordHashingBusy:
+            return password_busy_response()
         except Exception as e:
             return {"error": str(e)}, 500
         
@@ -252,6 +424,14 @@ class UserById(Resource):
 
 
 
+def get_vote_counts(votable_model, votable_id):
+    counts = db.session.execute(
+        db.select(votable_model.like_count, votable_model.dislike_count)
+        .where(votable_model.id == votable_id)
+    ).first()
+    return tuple(counts) if counts else (0, 0)
+
+
 class Votes(Resource):
     def post(self, votable_type, votable_id):
         data = request.get_json()
@@ -263,49 +443,48 @@ class Votes(Resource):
             return {"error": "Invalid or missing vote value"}, 400
 
         # Validate votable_type
-        valid_types = {"Article", "Comment", "FactCheck"}
-        if votable_type not in valid_types:
-            return {"error": f"Invalid votable_type. Must be one of {valid_types}"}, 400
+        if votable_type not in VOTABLE_MODELS:
+            return {"error": f"Invalid votable_type. Must be one of {set(VOTABLE_MODELS)}"}, 400
 
         if value not in (-1, 0, 1):
             return {"error": "Vote value must be +1, 0, or -1"}, 400
 
+        if not isinstance(user_id, int) or isinstance(user_id, bool):
+            return {"error": "Invalid user_id"}, 400
 
-        # Try to find existing vote
-        vote = db.session.query(Vote).filter_by(
-            user_id=user_id,
-            votable_type=votable_type,
-            votable_id=votable_id
-        ).first()
-
-        if vote:
-            if value == 0:
-                db.session.delete(vote)
-            else:
-                vote.value = value
-        else:
-            if value != 0:
-                vote = Vote(
-                    user_id=user_id,
-                    votable_type=votable_type,
-                    votable_id=votable_id,
-                    value=value
-                )
-                db.session.add(vote)
-
-        db.session.commit()
+        if write_behind_enabled():
+            counts = projected_vote_counts(
+                user_id, votable_type, votable_id, value, vote_buffer.pending_for(votable_type, votable_id)
+            )
+            if counts is None:
+                return {"error": f"{votable_type} not found"}, 404
+            vote_buffer.add(user_id, votable_type, votable_id, value)
+            like_count, dislike_count = counts
+            return {
+                "result": "vote queued",
+                "votable_type": votable_type,
+                "votable_id": votable_id,
+                "value": value,
+                "likes": like_count,
+                "dislikes": dislike_count
+            }, 202
 
-        like_count = db.session.query(Vote).filter_by(
-            votable_type=votable_type,
-            votable_id=votable_id,
-            value=1
-        ).count()
+        try:
+            previous_value, counts = record_vote(
+                user_id, votable_type, votable_id, value,
+                refresh_hotness=not score_recompute_deferred()
+            )
+            if counts is None:
+                db.session.rollback()
+                return {"error": f"{votable_type} not found"}, 404
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return {"error": "Invalid user_id"}, 400
 
-        dislike_count = db.session.query(Vote).filter_by(
-            votable_type=votable_type,
-            votable_id=votable_id,
-            value=-1
-        ).count()
+        if previous_value != value:
+            after_vote_commit({(votable_type, votable_id)})
+        like_count, dislike_count = counts
 
         return {
             "result": "vote recorded",
@@ -317,27 +496,180 @@ class Votes(Resource):
         }, 200
     
     def get(self, votable_type, votable_id):
+        if votable_type not in VOTABLE_MODELS:
+            return {"error": f"Invalid votable_type. Must be one of {set(VOTABLE_MODELS)}"}, 400
+
         try:
-            like_count = db.session.query(Vote).filter_by(
-                votable_type=votable_type,
-                votable_id=votable_id,
-                value=1
-            ).count()
-
-            dislike_count = db.session.query(Vote).filter_by(
-                votable_type=votable_type,
-                votable_id=votable_id,
-                value=-1
-            ).count()
-
-            return jsonify({
+            like_count, dislike_count = get_vote_counts(VOTABLE_MODELS[votable_type], votable_id)
+
+            # The counters are the whole payload, so they double as its version
+            etag = version_etag('votes', votable_type, votable_id, like_count, dislike_count)
+            return not_modified(etag) or add_validators(jsonify({
                 "likes": like_count,
                 "dislikes": dislike_count
-            })
+            }), etag)
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+MAX_USER_LOOKUP_IDS = 500
+
+class Users(Resource):
+    def get(self):
+        ids = request.args.get('ids', '')
+        try:
+            user_ids = {int(user_id) for user_id in ids.split(',') if user_id}
+        except ValueError:
+            return {"error": "ids must be a comma separated list of integers"}, 400
+
+        if len(user_ids) > MAX_USER_LOOKUP_IDS:
+            return {"error": f"At most {MAX_USER_LOOKUP_IDS} ids per request"}, 400
+        if not user_ids:
+            return jsonify([])
+
+        try:
+            # Compact projection: never touches the user's articles, comments or fact checks
+            rows = db.session.execute(
+                db.select(User.id, User.username, User.created_at).where(User.id.in_(user_ids))
+            )
+            return jsonify([
+                {
+                    "id": id,
+                    "username": username,
+                    "created_at": created_at.strftime(DATETIME_FORMAT) if created_at else None
+                }
+                for id, username, created_at in rows
+            ])
 
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+MAX_VOTE_TALLY_ITEMS = 500
+
+class VoteTallies(Resource):
+    def get(self):
+        # items=Article-1,Comment-7,... (the same keys the article page uses for its votes map)
+        requested = {}
+        for item in request.args.get('items', '').split(','):
+            if not item:
+                continue
+            votable_type, _, votable_id = item.partition('-')
+            if votable_type not in VOTABLE_MODELS or not votable_id.isdigit():
+                return {"error": f"Invalid item: {item}"}, 400
+            requested.setdefault(votable_type, set()).add(int(votable_id))
+
+        if sum(len(ids) for ids in requested.values()) > MAX_VOTE_TALLY_ITEMS:
+            return {"error": f"At most {MAX_VOTE_TALLY_ITEMS} items per request"}, 400
+
+        tallies = {
+            f"{votable_type}-{votable_id}": {"likes": 0, "dislikes": 0, "value": 0}
+            for votable_type, ids in requested.items()
+            for votable_id in ids
+        }
+        if not tallies:
+            return jsonify(tallies)
+
+        try:
+            user_id = session.get('user_id')
+            query = (
+                db.select(
+                    Vote.votable_type,
+                    Vote.votable_id,
+                    db.func.sum(db.case((Vote.value == 1, 1), else_=0)),
+                    db.func.sum(db.case((Vote.value == -1, 1), else_=0)),
+                    db.func.max(db.case((Vote.user_id == user_id, Vote.value), else_=None)),
+                )
+                .where(db.or_(*(
+                    db.and_(Vote.votable_type == votable_type, Vote.votable_id.in_(ids))
+                    for votable_type, ids in requested.items()
+                )))
+                .group_by(Vote.votable_type, Vote.votable_id)
+            )
+
+            for votable_type, votable_id, likes, dislikes, own_value in db.session.execute(query):
+                tallies[f"{votable_type}-{votable_id}"] = {
+                    "likes": likes,
+                    "dislikes": dislikes,
+                    "value": own_value or 0
+                }
+
+            return jsonify(tallies)
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 50
+
+class Search(Resource):
+    def get(self):
+        query = request.args.get('q', '')
+        match = match_expression(query)
+        if match is None:
+            return {"error": "Missing search query"}, 400
+
+        requested = request.args.get('type')
+        types = requested.split(',') if requested else list(SEARCHABLE)
+        if not set(types) <= set(SEARCHABLE):
+            return {"error": f"Invalid type. Must be one of {set(SEARCHABLE)}"}, 400
+
+        if db.session.get_bind().dialect.name != 'sqlite':
+            return {"error": "Search is only available on SQLite"}, 501
+
+        limit = get_page_size(request.args, SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE)
+        after = None
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                cursor_match, rank, kind, last_id = decode_cursor(cursor, 4)
+                if cursor_match != match:
+                    raise ValueError("Cursor does not match query")
+                after = (float(rank), kind, int(last_id))
+            except (ValueError, TypeError):
+                return {"error": "Invalid cursor"}, 400
+
+        hits = search(match, types, limit + 1, after)
+        next_cursor = None
+        if len(hits) > limit:
+            hits = hits[:limit]
+            last = hits[-1]
+            next_cursor = encode_cursor(match, last.rank, last.type, last.id)
+
+        # Point every hit at the article page that shows it, with that article's title
+        article_ids = {(hit.type, hit.id): hit.id for hit in hits if hit.type == 'article'}
+        for kind, model in (('comment', Comment), ('fact_check', FactCheck)):
+            ids = [hit.id for hit in hits if hit.type == kind]
+            if ids:
+                rows = db.session.execute(db.select(model.id, model.article_id).where(model.id.in_(ids)))
+                article_ids.update({(kind, id): article_id for id, article_id in rows})
+        titles = {}
+        if article_ids:
+            titles = dict(db.session.execute(
+                db.select(Article.id, Article.title).where(Article.id.in_(set(article_ids.values())))
+            ).all())
+
+        results = []
+        for hit in hits:
+            article_id = article_ids.get((hit.type, hit.id))
+            results.append({
+                "type": hit.type,
+                "id": hit.id,
+                "article_id": article_id,
+                "article_title": titles.get(article_id),
+                "snippet": highlight(hit.snippet),
+                "rank": hit.rank
+            })
+
+        return {"results": results, "next_cursor": next_cursor}, 200
+
+class Metrics(Resource):
+    def get(self):
+        token = app.config['METRICS_TOKEN']
+        supplied = request.headers.get('Authorization', '')
+        if token and not hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {token}".encode('utf-8')):
+            return {"error": "Unauthorized"}, 401
+        return make_response(metrics.registry.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
 class CreateFactCheck(Resource):
     def post(self):
         try:
@@ -362,8 +694,10 @@ class CreateFactCheck(Resource):
             )
 
             db.session.add(new_fact_check)
+            Article.touch(Article.id == new_fact_check.article_id)
             db.session.commit()
-            return make_response(new_fact_check.to_dict(), 201)
+            feed_cache.invalidate()
+            return make_response(serialize(new_fact_check, 'summary'), 201)
         
         except Exception as e:
             return {"error": str(e)}, 500
@@ -402,8 +736,10 @@ class FactCheckById(Resource):
                 
                 fact_check.fact_check_url = data['fact_check_url']
 
+            Article.touch(Article.id == fact_check.article_id)
             db.session.commit()
-            return fact_check.to_dict(), 200
+            feed_cache.invalidate()
+            return serialize(fact_check, 'summary'), 200
 
         except Exception as e:
             return {"error": str(e)}, 500
@@ -414,7 +750,9 @@ class FactCheckById(Resource):
             return make_response({"error": "FactCheck not found"}, 400)
         
         db.session.delete(fact_check)
+        Article.touch(Article.id == fact_check.article_id)
         db.session.commit()
+        feed_cache.invalidate()
         return make_response("", 204)
 
         
@@ -440,8 +778,10 @@ class CreateComment(Resource):
             )
 
             db.session.add(new_comment)
+            Article.touch(Article.id == new_comment.article_id)
             db.session.commit()
-            return make_response(new_comment.to_dict(), 201)
+            feed_cache.invalidate()
+            return make_response(serialize(new_comment, 'detail'), 201)
         
         except Exception as e:
             return {"error": str(e)}, 500
@@ -464,8 +804,10 @@ class CommentById(Resource):
                 
                 comment.content = data['content']
 
+            Article.touch(Article.id == comment.article_id)
             db.session.commit()
-            return comment.to_dict(), 200
+            feed_cache.invalidate()
+            return serialize(comment, 'summary'), 200
 
         except Exception as e:
             return {"error": str(e)}, 500
@@ -476,7 +818,9 @@ class CommentById(Resource):
             return make_response({"error": "Comment not found"}, 400)
         
         db.session.delete(comment)
+        Article.touch(Article.id == comment.article_id)
         db.session.commit()
+        feed_cache.invalidate()
         return make_response("", 204)
         
 # Add to API
@@ -487,13 +831,36 @@ api.add_resource(Logout, '/logout')
 api.add_resource(Articles, '/articles')
 api.add_resource(ArticleById, '/article/<int:id>')
 api.add_resource(CreateArticle, '/create_article')
+api.add_resource(ImportArticles, '/import/articles')
 api.add_resource(UserById, '/user/<int:id>')
+api.add_resource(Users, '/users')
 api.add_resource(Votes, '/votes/<string:votable_type>/<int:votable_id>')
+api.add_resource(VoteTallies, '/votes')
+api.add_resource(Search, '/search')
+api.add_resource(Metrics, '/metrics')
 api.add_resource(CreateFactCheck, '/create_fact_check')
 api.add_resource(CreateComment, '/create_comment')
 api.add_resource(FactCheckById, '/fact_check/<int:id>')
 api.add_resource(CommentById, '/comment/<int:id>')
 
+@app.cli.command("rebuild-vote-counts")
+def rebuild_vote_counts_command():
+    """Recompute the like/dislike/score counters and hot scores from the votes table."""
+    rebuild_vote_counts()
+    feed_cache.invalidate()
+    print("Vote counters and hot scores rebuilt.")
+
+
+@app.cli.command("import-articles")
+@click.argument("source", type=click.File("rb"))
+@click.option("--batch-size", type=click.IntRange(min=1), default=None, help="Rows per transaction.")
+def import_articles_command(source, batch_size):
+    """Import articles from an NDJSON file (- for stdin)."""
+    report = import_articles(source, batch_size or app.config['IMPORT_BATCH_SIZE'])
+    for error in report.errors:
+        print(f"line {error['line']}: {error['error']}")
+    print(f"Imported {report.imported} articles, skipped {report.duplicates} duplicates, {report.error_count} errors.")
+
 
 if __name__ == '__main__':
     app.run(port=5555, debug=True)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Endpoint benchmarks against a large synthetic dataset, checked against a
+stored baseline.
+
+    python bench.py                      # run and compare with bench_baseline.json
+    python bench.py --save-baseline      # run and record the numbers as the new baseline
+    python bench.py --reseed             # rebuild the benchmark database first
+
+Uses its own database, instance/bench.db (or DATABASE_URL), and builds it with
+seed.py's generator on first use. Each scenario sends --requests requests
+through the Flask test client from --concurrency threads, each with its own
+client, and reports p50/p95/p99 latency, throughput and SQL statements per
+request. votes_post and login write to the database as they would in
+production; --reseed puts it back as generated.
+
+The feed and session caches are off (TTL 0), so every request does its
+database work and a change to a query in app.py or models.py shows up in
+the numbers. Set FEED_CACHE_TTL / SESSION_CACHE_TTL to measure with them on.
+
+A scenario fails against the baseline when p95 or p99 is more than
+--tolerance slower, throughput more than --tolerance lower, or it averages
+half a statement per request more. Latency depends on the machine, so only
+compare with a baseline saved on the same kind of machine, and with the same
+dataset; the baseline records the dataset it was taken on.
+"""
+import os
+
+# Must be set before config.py creates the engine and the caches
+os.environ.setdefault('DATABASE_URL', 'sqlite:///bench.db')
+os.environ.setdefault('FEED_CACHE_TTL', '0')
+os.environ.setdefault('SESSION_CACHE_TTL', '0')
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event, func
+
+import seed
+from app import app
+from models import db, Article, User
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+# seed.py arguments for the benchmark database
+DATASET = {
+    "users": 20000,
+    "articles": 50000,
+    "comments": 500000,
+    "fact_checks": 80000,
+    "votes": 1000000,
+    "seed": 1,
+}
+
+# Every check bcrypts the password, so logins run at a tenth of the request count
+LOGIN_SHARE = 0.1
+
+
+class Dataset:
+    """What the scenarios need to know about the database: id ranges and popularity."""
+
+    def __init__(self):
+        self.user_count = db.session.execute(db.select(func.count(User.id))).scalar()
+        self.article_ids = db.session.execute(db.select(Article.id)).scalars().all()
+        # Most reads are of a few articles: the ones at the top of the feed
+        self.popular_ids = db.session.execute(
+            db.select(Article.id).order_by(Article.hot_score.desc()).limit(100)
+        ).scalars().all()
+        self.usernames = db.session.execute(
+            db.select(User.username).order_by(User.id).limit(1000)
+        ).scalars().all()
+
+    def article(self, rng):
+        return rng.choice(self.popular_ids if rng.random() < 0.8 else self.article_ids)
+
+
+# name -> function(rng, dataset) returning (method, path, JSON body)
+SCENARIOS = {
+    'articles_hot': lambda rng, data: ('GET', '/articles?sort=hot', None),
+    'articles_new': lambda rng, data: ('GET', '/articles?sort=new', None),
+    'article_detail': lambda rng, data: ('GET', f'/article/{data.article(rng)}', None),
+    'votes_get': lambda rng, data: ('GET', f'/votes/Article/{data.article(rng)}', None),
+    'votes_post': lambda rng, data: (
+        'POST', f'/votes/Article/{data.article(rng)}',
+        {"user_id": rng.randint(1, data.user_count), "value": rng.choice((1, 1, 1, -1, 0))},
+    ),
+    'login': lambda rng, data: (
+        'POST', '/login', {"username": rng.choice(data.usernames), "password": seed.DEFAULT_PASSWORD},
+    ),
+    'check_session': lambda rng, data: ('GET', '/check_session', None),
+}
+
+
+class StatementCounter:
+    """SQL statements per request, counted per thread so concurrent requests don't mix."""
+
+    def __init__(self, engine):
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._record)
+
+    def _record(self, *args):
+        self._local.count = getattr(self._local, 'count', 0) + 1
+
+    def reset(self):
+        self._local.count = 0
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+
+def percentile(sorted_values, fraction):
+    # Nearest rank
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def worker(name, requests, warmup, index, seed_value, dataset, counter, ready):
+    rng = random.Random(f"{seed_value}-{name}-{index}")
+    client = app.test_client()
+    # check_session needs someone signed in; it's a cookie, so once per client
+    if name == 'check_session':
+        client.post('/login', json={"username": dataset.usernames[index % len(dataset.usernames)],
+                                    "password": seed.DEFAULT_PASSWORD})
+
+    def send():
+        method, path, body = SCENARIOS[name](rng, dataset)
+        return client.open(path, method=method, json=body)
+
+    for _ in range(warmup):
+        send()
+    # Start the clock together, so throughput is over the time all threads were busy
+    ready.wait()
+
+    timings, statements, errors = [], [], 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        counter.reset()
+        start = time.perf_counter()
+        response = send()
+        timings.append(time.perf_counter() - start)
+        statements.append(counter.count)
+        if response.status_code >= 400:
+            errors += 1
+    return timings, statements, errors, started, time.perf_counter()
+
+
+def run_scenario(name, args, dataset, counter):
+    requests = args.requests if name != 'login' else max(1, int(args.requests * LOGIN_SHARE))
+    threads = min(args.concurrency, requests)
+    per_thread = [requests // threads + (i < requests % threads) for i in range(threads)]
+    ready = threading.Barrier(threads)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [
+            pool.submit(worker, name, count, args.warmup // threads, i, args.seed, dataset, counter, ready)
+            for i, count in enumerate(per_thread)
+        ]
+        results = [future.result() for future in futures]
+
+    timings = sorted(t for result in results for t in result[0])
+    statements = [s for result in results for s in result[1]]
+    wall = max(result[4] for result in results) - min(result[3] for result in results)
+    return {
+        "requests": len(timings),
+        "errors": sum(result[2] for result in results),
+        "p50_ms": round(percentile(timings, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 2),
+        "throughput_rps": round(len(timings) / wall, 1),
+        "statements_per_request": round(sum(statements) / len(statements), 2),
+    }
+
+
+def regressions(result, baseline, tolerance):
+    """Why result is worse than baseline, as a list of messages."""
+    problems = []
+    for metric in ('p95_ms', 'p99_ms'):
+        # Sub-millisecond differences are noise whatever the ratio
+        if result[metric] > baseline[metric] * (1 + tolerance) + 1:
+            problems.append(f"{metric} {result[metric]} vs {baseline[metric]}")
+    if result['throughput_rps'] < baseline['throughput_rps'] / (1 + tolerance):
+        problems.append(f"throughput_rps {result['throughput_rps']} vs {baseline['throughput_rps']}")
+    if result['statements_per_request'] > baseline['statements_per_request'] + 0.5:
+        problems.append(
+            f"statements_per_request {result['statements_per_request']} vs {baseline['statements_per_request']}"
+        )
+    if result['errors'] > baseline.get('errors', 0):
+        problems.append(f"errors {result['errors']} vs {baseline.get('errors', 0)}")
+    return problems
+
+
+def ensure_dataset(reseed):
+    if not reseed:
+        try:
+            if db.session.execute(db.select(func.count(Article.id))).scalar():
+                return
+        except Exception:
+            db.session.rollback()
+    argv = [f"--{key.replace('_', '-')}={value}" for key, value in DATASET.items()]
+    seed.run_seed(seed.build_parser().parse_args(argv))
+
+
+def load_baseline():
+    try:
+        with open(BASELINE_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed requests per scenario.")
+    parser.add_argument("--seed", type=int, default=1, help="Seeds the request mix.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown, 0.5 = 50%%.")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="Run only these.")
+    parser.add_argument("--reseed", action="store_true", help="Rebuild the benchmark database.")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write the results to {os.path.basename(BASELINE_FILE)}.")
+    args = parser.parse_args()
+    if args.requests < 1 or args.concurrency < 1:
+        parser.error("--requests and --concurrency must be at least 1")
+
+    with app.app_context():
+        ensure_dataset(args.reseed)
+        dataset = Dataset()
+        db.session.remove()
+        counter = StatementCounter(db.engine)
+
+    baseline = load_baseline()
+    baseline_results = {}
+    if baseline and not args.save_baseline:
+        if baseline.get("dataset") != DATASET:
+            print(f"{os.path.basename(BASELINE_FILE)} was taken on a different dataset; not comparing\n")
+        else:
+            baseline_results = baseline["results"]
+
+    print(f"{args.requests} requests per scenario, concurrency {args.concurrency}")
+    print(f"{'scenario':<16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'stmts':>7}{'errors':>8}")
+    results, failures = {}, {}
+    for name in args.scenario or SCENARIOS:
+        result = run_scenario(name, args, dataset, counter)
+        results[name] = result
+        problems = regressions(result, baseline_results[name], args.tolerance) if name in baseline_results else []
+        if problems:
+            failures[name] = problems
+        print(f"{name:<16}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+              f"{result['throughput_rps']:>9.1f}{result['statements_per_request']:>7.2f}{result['errors']:>8}"
+              f"{'  REGRESSED' if problems else ''}")
+
+    if args.save_baseline:
+        saved = (baseline or {}).get("results", {}) if (baseline or {}).get("dataset") == DATASET else {}
+        saved.update(results)
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump({
+                "dataset": DATASET,
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "results": saved,
+            }, f, indent=2)
+            f.write('\n')
+        print(f"\nSaved baseline to {os.path.basename(BASELINE_FILE)}")
+        return 0
+
+    if failures:
+        print(f"\n{len(failures)} scenario(s) regressed beyond {args.tolerance:.0%} of the baseline:")
+        for name, problems in failures.items():
+            print(f"  {name}: {'; '.join(problems)}")
+        return 1
+    if baseline_results:
+        print("\nAll scenarios within the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Compare SerializerMixin.to_dict(profile) with the compiled serializers.
+
+Seeds a throwaway in-memory SQLite database (the app database is not touched),
+loads the articles with their relationships up front so only serialization is
+timed, checks both paths produce identical output and prints the speedup.
+
+    python bench_serializers.py --articles 2000 --comments 20 --fact-checks 3
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session, selectinload
+
+from models import db, User, Article, Comment, FactCheck
+from serializers import serialize_many
+
+
+def seed(session, articles, comments, fact_checks, users=200):
+    rng = random.Random(1234)
+    now = datetime(2026, 1, 1)
+
+    session.execute(insert(User), [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@example.com",
+         "_password_hash": "x", "created_at": now}
+        for i in range(1, users + 1)
+    ])
+    session.execute(insert(Article), [
+        {"id": i, "title": f"Article {i}", "url": f"https://example.com/{i}",
+         "image_url": f"https://example.com/{i}.jpg", "submitted_by_id": rng.randint(1, users),
+         "created_at": now - timedelta(minutes=i), "updated_at": now,
+         "like_count": rng.randint(0, 50), "dislike_count": rng.randint(0, 10)}
+        for i in range(1, articles + 1)
+    ])
+    session.execute(insert(Comment), [
+        {"content": f"Comment {n} on {a}", "user_id": rng.randint(1, users), "article_id": a,
+         "created_at": now, "updated_at": now}
+        for a in range(1, articles + 1) for n in range(comments)
+    ])
+    session.execute(insert(FactCheck), [
+        {"content": f"Fact check {n} on {a}", "fact_check_level": rng.randint(0, 4),
+         "user_id": rng.randint(1, users), "article_id": a}
+        for a in range(1, articles + 1) for n in range(fact_checks)
+    ])
+    session.commit()
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=1000)
+    parser.add_argument("--comments", type=int, default=10, help="comments per article")
+    parser.add_argument("--fact-checks", type=int, default=2, help="fact checks per article")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    db.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        seed(session, args.articles, args.comments, args.fact_checks)
+        articles = session.execute(
+            select(Article).options(
+                selectinload(Article.submitted_by),
+                selectinload(Article.fact_checks),
+                selectinload(Article.comments),
+            )
+        ).scalars().all()
+
+        print(f"{len(articles)} articles, {args.comments} comments and "
+              f"{args.fact_checks} fact checks each, best of {args.repeat}")
+        print(f"{'profile':<10}{'to_dict':>12}{'compiled':>12}{'speedup':>10}")
+
+        for profile in ("summary", "detail"):
+            expected = [article.to_dict(profile) for article in articles]
+            if serialize_many(articles, profile) != expected:
+                raise SystemExit(f"compiled '{profile}' output differs from to_dict('{profile}')")
+
+            slow = best_of(args.repeat, lambda: [article.to_dict(profile) for article in articles])
+            fast = best_of(args.repeat, lambda: serialize_many(articles, profile))
+            print(f"{profile:<10}{slow * 1000:>10.1f}ms{fast * 1000:>10.1f}ms{slow / fast:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
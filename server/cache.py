@@ -0,0 +1,199 @@
+"""
+Response caching for read-heavy endpoints.
+
+A ResponseCache stores JSON-ready payloads in a backend and namespaces every
+key with a version number. Writes don't hunt down affected entries; they bump
+the version, which orphans every older entry at once. Where a write knows the
+one entry it changed, as with per-user session payloads, it deletes just that.
+Orphans expire by TTL, which is also the upper bound on staleness when each
+process keeps its own in-memory backend and can't see the others' writes.
+
+Backends:
+    LRUCache     in-process, bounded, per worker (the default)
+    ValkeyCache  shared across workers, wraps a redis-py compatible client
+    FakeValkey   dict-backed stand-in for that client, for tests and local runs
+"""
+from collections import OrderedDict
+import json
+import threading
+import time
+
+from config import app
+import metrics
+
+
+class LRUCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_counter(self, key):
+        # Counters live outside the LRU so eviction can never roll a version back
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class ValkeyCache:
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url):
+        import redis  # Only needed when a shared backend is configured
+
+        # redis-py speaks the same protocol but doesn't know the valkey:// scheme
+        if url.startswith('valkey://'):
+            url = 'redis://' + url[len('valkey://'):]
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(key, json.dumps(value, separators=(',', ':')), ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def get_counter(self, key):
+        raw = self.client.get(key)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+
+class FakeValkey:
+    """The subset of the redis-py client ValkeyCache uses, kept in a dict."""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def get(self, key):
+        if key in self.expires and self.expires[key] < time.monotonic():
+            self.delete(key)
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value.encode('utf-8') if isinstance(value, str) else value
+        if ex is not None:
+            self.expires[key] = time.monotonic() + ex
+        else:
+            self.expires.pop(key, None)
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+
+    def incr(self, key):
+        value = int(self.get(key) or 0) + 1
+        self.data[key] = str(value).encode('utf-8')
+        return value
+
+
+class ResponseCache:
+    def __init__(self, namespace, backend=None, ttl=30):
+        self.namespace = namespace
+        self.backend = backend
+        self.ttl = ttl
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    @property
+    def version_key(self):
+        return f"{self.namespace}:version"
+
+    def version(self):
+        return self.backend.get_counter(self.version_key) if self.enabled else 0
+
+    def _key(self, parts):
+        return ':'.join([self.namespace, f"v{self.version()}", *(str(part) for part in parts)])
+
+    def get(self, *parts):
+        if not self.enabled:
+            return None
+        value = self.backend.get(self._key(parts))
+        if value is None:
+            metrics.cache_misses.inc(self.namespace)
+        else:
+            metrics.cache_hits.inc(self.namespace)
+        return value
+
+    def set(self, value, *parts):
+        if self.enabled:
+            self.backend.set(self._key(parts), value, self.ttl)
+
+    def delete(self, *parts):
+        if self.enabled:
+            self.backend.delete(self._key(parts))
+
+    def invalidate(self):
+        if self.enabled:
+            self.backend.incr(self.version_key)
+
+
+def make_backend(kind, url=None, maxsize=256):
+    if kind == 'memory':
+        return LRUCache(maxsize=maxsize)
+    if kind == 'valkey':
+        return ValkeyCache.from_url(url)
+    if kind == 'none':
+        return None
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+
+feed_cache = ResponseCache(
+    'feed',
+    backend=make_backend(
+        app.config['FEED_CACHE_BACKEND'],
+        url=app.config['CACHE_VALKEY_URL'],
+        maxsize=app.config['FEED_CACHE_SIZE'],
+    ),
+    ttl=app.config['FEED_CACHE_TTL'],
+)
+
+session_cache = ResponseCache(
+    'session',
+    backend=make_backend(
+        app.config['SESSION_CACHE_BACKEND'],
+        url=app.config['CACHE_VALKEY_URL'],
+        maxsize=app.config['SESSION_CACHE_SIZE'],
+    ),
+    ttl=app.config['SESSION_CACHE_TTL'],
+)
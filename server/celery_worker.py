@@ -2,4 +2,4 @@ from tasks import celery
 
 # This starts the worker when run directly
 if __name__ == "__main__":
-    celery.worker_main()
+    celery.worker_main(argv=["worker", "--loglevel=info"])
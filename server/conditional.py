@@ -0,0 +1,65 @@
+"""
+Conditional GET helpers.
+
+Handlers work out a validator (ETag and/or Last-Modified) from something cheap
+(a version column, counters, a cached page hash) and call not_modified()
+before loading or serializing anything. If the client's copy is current they
+return the 304 as is; otherwise they build the body and pass the response
+through add_validators().
+"""
+import hashlib
+import json
+from datetime import timezone
+
+from flask import make_response, request
+
+
+def payload_etag(payload):
+    raw = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def version_etag(*parts):
+    return '-'.join(str(part) for part in parts)
+
+
+def _as_utc(value):
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def version_timestamp(value):
+    """A version column as seconds since the epoch, for version_etag(); naive values are UTC."""
+    return _as_utc(value).timestamp() if value is not None else 0
+
+
+def add_validators(response, etag=None, last_modified=None):
+    if etag is not None:
+        response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _as_utc(last_modified)
+    # Let browsers keep the body but always revalidate it with us before use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def not_modified(etag=None, last_modified=None):
+    """Return a 304 response if the request's validators still match, otherwise None."""
+    last_modified = _as_utc(last_modified)
+
+    if etag is not None and request.if_none_match:
+        # When both are sent, If-None-Match wins and If-Modified-Since is ignored
+        # Weak comparison: compressed responses carry the same ETag, weakened (see encoding.py)
+        if not request.if_none_match.contains_weak(etag):
+            return None
+    elif last_modified is not None and request.if_modified_since:
+        # HTTP dates have whole-second precision
+        if last_modified.replace(microsecond=0) > request.if_modified_since:
+            return None
+    else:
+        return None
+
+    return add_validators(make_response('', 304), etag, last_modified)
@@ -1,4 +1,5 @@
 # Standard library imports
+import os
 import sqlite3
 
 # Remote library imports
@@ -11,35 +12,158 @@ from sqlalchemy import MetaData, event
 from sqlalchemy.engine import Engine
 from flask_bcrypt import Bcrypt
 
-import os
-
 # Local imports
+from routing import RoutingSession
+from instrumentation import instrument
+import encoding
+import metrics
 
 # Instantiate app, set attributes
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
+
+# Database profile: DB_PROFILE=sqlite (the default) or postgres. DATABASE_URL overrides
+# the profile's default URI, and each setting below can be overridden on its own.
+DATABASE_PROFILES = {
+    'sqlite': 'sqlite:///app.db',
+    'postgres': 'postgresql://localhost/pyra',
+}
+app.config['DB_PROFILE'] = os.environ.get('DB_PROFILE', 'sqlite')
+if app.config['DB_PROFILE'] not in DATABASE_PROFILES:
+    raise ValueError(f"Unknown DB_PROFILE: {app.config['DB_PROFILE']}")
+database_url = os.environ.get('DATABASE_URL', DATABASE_PROFILES[app.config['DB_PROFILE']])
+# Some hosts still hand out the postgres:// scheme, which SQLAlchemy no longer accepts
+if database_url.startswith('postgres://'):
+    database_url = 'postgresql://' + database_url[len('postgres://'):]
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.json.compact = False
+
+# Response encoding (see encoding.py). JSON_PROVIDER is 'auto' (orjson if installed),
+# 'orjson' or 'default'. Bodies of COMPRESS_MIN_SIZE bytes or more are gzip/brotli
+# compressed for clients that accept it; 0 turns compression off.
+app.config['JSON_PROVIDER'] = os.environ.get('JSON_PROVIDER', 'auto')
+app.config['JSON_COMPACT'] = os.environ.get('JSON_COMPACT', '1') == '1'
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+app.json = encoding.json_provider_class(app.config['JSON_PROVIDER'])(app)
+app.json.compact = app.config['JSON_COMPACT']
+
+# Read replicas: comma-separated URLs, each added as a replica_<n> bind. routing.py sends
+# read-only requests there, except for clients that wrote within DATABASE_STICKY_SECONDS.
+replica_urls = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+app.config['SQLALCHEMY_BINDS'] = {f'replica_{n}': url for n, url in enumerate(replica_urls, 1)}
+app.config['DATABASE_REPLICAS'] = list(app.config['SQLALCHEMY_BINDS'])
+app.config['DATABASE_STICKY_SECONDS'] = float(os.environ.get('DATABASE_STICKY_SECONDS', 5))
+
+# Applied to every new SQLite connection by set_sqlite_pragma. WAL lets readers carry on
+# while a write is in progress, and with WAL synchronous=NORMAL only risks the last
+# commits on power loss, never corruption. busy_timeout makes a writer wait for the
+# lock instead of failing with "database is locked".
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Negative values are KiB rather than pages
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+    'temp_store': os.environ.get('SQLITE_TEMP_STORE', 'MEMORY'),
+}
+
+# Connection pool for server databases (the postgres profile needs psycopg2 installed).
+# SQLite connections are cheap to open and its in-memory pools don't take these options.
+# MeteredQueuePool is QueuePool counting checkouts for /metrics; in-memory SQLite
+# databases get Flask-SQLAlchemy's StaticPool whatever this says.
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'poolclass': metrics.MeteredQueuePool}
+if app.config['DB_PROFILE'] == 'postgres':
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'].update({
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        # Recycle before the server or a proxy drops idle connections
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_pre_ping': True,
+    })
+
+# Article feed response cache: 'memory' (per process), 'valkey' (shared) or 'none'.
+# FEED_CACHE_TTL is the longest a cached page can outlive the write that changed it.
+app.config['FEED_CACHE_BACKEND'] = os.environ.get('FEED_CACHE_BACKEND', 'memory')
+app.config['FEED_CACHE_TTL'] = int(os.environ.get('FEED_CACHE_TTL', 30))
+app.config['FEED_CACHE_SIZE'] = int(os.environ.get('FEED_CACHE_SIZE', 256))
+app.config['CACHE_VALKEY_URL'] = os.environ.get('CACHE_VALKEY_URL', 'valkey://localhost:6379/1')
+
+# /check_session payloads, keyed by user id. Same backend choices as the feed cache;
+# with per-process backends a profile edit can take up to SESSION_CACHE_TTL to show elsewhere.
+app.config['SESSION_CACHE_BACKEND'] = os.environ.get('SESSION_CACHE_BACKEND', 'memory')
+app.config['SESSION_CACHE_TTL'] = int(os.environ.get('SESSION_CACHE_TTL', 60))
+app.config['SESSION_CACHE_SIZE'] = int(os.environ.get('SESSION_CACHE_SIZE', 1024))
+
+# Score recomputation: 'inline' refreshes hot_score inside Votes.post, 'celery' batches it
+# in tasks.recompute_scores. Use CELERY_BROKER_URL=memory:// with CELERY_TASK_ALWAYS_EAGER=1
+# to run the pipeline in-process without a broker.
+app.config['SCORE_RECOMPUTE'] = os.environ.get('SCORE_RECOMPUTE', 'inline')
+app.config['SCORE_RECOMPUTE_DEBOUNCE'] = float(os.environ.get('SCORE_RECOMPUTE_DEBOUNCE', 5))
+app.config['SCORE_RECOMPUTE_BATCH_SIZE'] = int(os.environ.get('SCORE_RECOMPUTE_BATCH_SIZE', 500))
+app.config['CELERY_BROKER_URL'] = os.environ.get('CELERY_BROKER_URL', 'valkey://localhost:6379/0')
+# Tasks don't return anything callers wait on, so no result backend unless asked for
+app.config['CELERY_RESULT_BACKEND'] = os.environ.get('CELERY_RESULT_BACKEND')
+app.config['CELERY_TASK_ALWAYS_EAGER'] = os.environ.get('CELERY_TASK_ALWAYS_EAGER', '0') == '1'
+
+# Vote write-behind: queue votes in memory and write them in batched transactions every
+# VOTE_FLUSH_INTERVAL seconds. Faster under load, but a crash loses the unflushed queue.
+app.config['VOTE_WRITE_BEHIND'] = os.environ.get('VOTE_WRITE_BEHIND', '0') == '1'
+app.config['VOTE_FLUSH_INTERVAL'] = float(os.environ.get('VOTE_FLUSH_INTERVAL', 0.5))
+app.config['VOTE_FLUSH_BATCH_SIZE'] = int(os.environ.get('VOTE_FLUSH_BATCH_SIZE', 500))
 
 # Define metadata, instantiate db
 metadata = MetaData(naming_convention={
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
 })
-db = SQLAlchemy(metadata=metadata)
+db = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
 migrate = Migrate(app, db)
 db.init_app(app)
 
-# Enable foreign key support in SQLite (After app and db initialization)
+# Enable foreign key support and the SQLITE_PRAGMAS profile in SQLite (After app and db initialization)
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_connection, connection_record):
     if isinstance(dbapi_connection, sqlite3.Connection):
         cursor = dbapi_connection.cursor()
         cursor.execute("PRAGMA foreign_keys=ON;")
+        for name, value in app.config['SQLITE_PRAGMAS'].items():
+            cursor.execute(f"PRAGMA {name}={value};")
         cursor.close()
 
+# Bulk article import (see importer.py). POST /import/articles is disabled unless
+# IMPORT_TOKEN is set, and then requires it as a bearer token.
+app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+app.config['IMPORT_TOKEN'] = os.environ.get('IMPORT_TOKEN')
+
+# Password hashing (see passwords.py). Each step of BCRYPT_LOG_ROUNDS doubles the cost of
+# a hash; existing hashes are upgraded to a new value as their users log in.
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+# Seconds to wait for a queue slot, then for the hash itself, before answering 503
+app.config['PASSWORD_HASH_WAIT'] = float(os.environ.get('PASSWORD_HASH_WAIT', 0.5))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 5))
+
+# Request instrumentation (see instrumentation.py): a Server-Timing header on every
+# response, and statements slower than SLOW_QUERY_MS logged to the "slow_query" logger.
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '1') == '1'
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 100))
+
+# Prometheus metrics at /metrics (see metrics.py). Multi-process servers need
+# METRICS_MULTIPROC_DIR, shared by all their workers, for the totals to add up.
+# METRICS_TOKEN, if set, is required as a bearer token.
+app.config['METRICS_MULTIPROC_DIR'] = os.environ.get('METRICS_MULTIPROC_DIR')
+app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+metrics.configure(app.config['METRICS_MULTIPROC_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+
 # Instantiate REST API
 api = Api(app)
+# Compression registers first so it runs last, on the finished response
+encoding.init_app(app, api)
+instrument(app)
 bcrypt = Bcrypt()
+bcrypt.init_app(app)
 
 app.config['SECRET_KEY'] = os.urandom(24)
 
@@ -0,0 +1,208 @@
+"""
+Response encoding: the JSON provider, streamed lists and compression.
+
+app.json is one of JSON_PROVIDERS, picked by JSON_PROVIDER. 'orjson' encodes
+several times faster than the standard library and 'auto' uses it when it's
+installed; both give the same JSON. Dicts returned from Resources go through
+app.json too (output_json below, registered as flask-restful's JSON
+representation), so every response is encoded the same way and, with
+JSON_COMPACT, without the pretty-printing whitespace.
+
+stream_list() yields a {"<key>": [...], ...} document a chunk at a time, for
+list endpoints that read their rows from a server-side cursor (yield_per):
+only one batch of rows is in memory at once, however long the list.
+
+compress() gzips or brotli-compresses (brotli only if the package is
+installed) JSON and text bodies of COMPRESS_MIN_SIZE bytes or more for
+clients that accept it, streamed bodies chunk by chunk. A compressed body
+isn't byte-for-byte the one its ETag was computed from, so its ETag is made
+weak; conditional.not_modified compares weakly, as If-None-Match requires.
+"""
+import logging
+import zlib
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+from instrumentation import timed
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library encoder is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/plain', 'text/html', 'text/csv'}
+
+# Dynamic responses are compressed once per request, so favour speed over the last few percent
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Bytes of encoded rows stream_list() collects before yielding them
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class JSONProvider(DefaultJSONProvider):
+    """The standard library encoder, with encoding counted as serialization time."""
+
+    # UTF-8 as it is, like orjson, rather than \u escapes
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        with timed('serialize'):
+            return super().dumps(obj, **kwargs)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """orjson, producing what JSONProvider does: sorted keys, Flask's date and default handling."""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        with timed('serialize'):
+            return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+JSON_PROVIDERS = {
+    'default': JSONProvider,
+    'orjson': OrjsonProvider,
+}
+
+
+def json_provider_class(name):
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'default'
+    if name not in JSON_PROVIDERS:
+        raise ValueError(f"Unknown JSON_PROVIDER: {name}")
+    if name == 'orjson' and orjson is None:
+        raise ValueError("JSON_PROVIDER=orjson needs the orjson package installed")
+    return JSON_PROVIDERS[name]
+
+
+def output_json(data, code, headers=None):
+    """flask-restful's JSON representation, through app.json."""
+    response = current_app.json.response(data)
+    response.status_code = code
+    response.headers.extend(headers or {})
+    return response
+
+
+def stream_list(key, items, tail=None):
+    """
+    Yield '{"<key>": [item, ...], <tail>}' in chunks as items, an iterator of
+    JSON-ready values, is consumed. tail is called once the items run out and
+    returns the document's other fields, so it can depend on what was streamed.
+    """
+    dumps = current_app.json.dumps
+    buffered = [f'{{{dumps(key)}:[']
+    size = 0
+    first = True
+    for item in items:
+        encoded = dumps(item)
+        buffered.append(encoded if first else ',' + encoded)
+        first = False
+        size += len(encoded)
+        if size >= STREAM_CHUNK_SIZE:
+            yield ''.join(buffered).encode('utf-8')
+            buffered, size = [], 0
+    buffered.append(']')
+    for name, value in (tail() if tail else {}).items():
+        buffered.append(f',{dumps(name)}:{dumps(value)}')
+    buffered.append('}\n')
+    yield ''.join(buffered).encode('utf-8')
+
+
+def negotiate_encoding():
+    """The best encoding the client accepts, 'br' or 'gzip', or None."""
+    accepted = request.accept_encodings
+    choices = [name for name in ('br', 'gzip') if name != 'br' or brotli is not None]
+    best = max(choices, key=lambda name: accepted.quality(name), default=None)
+    return best if best and accepted.quality(best) > 0 else None
+
+
+class _Compressor:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits 31: a gzip header and trailer around the deflate stream
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self):
+        """Everything compressed so far, so a streamed chunk reaches the client now."""
+        if self.encoding == 'br':
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+
+def _compress_stream(chunks, compressor):
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # Close the inner generator too, so a dropped client releases its cursor
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+
+
+def compress(response):
+    """after_request hook: compress the body if the client accepts it and it's worth it."""
+    if not current_app.config['COMPRESS_MIN_SIZE'] or response.direct_passthrough:
+        return response
+    if response.status_code < 200 or response.status_code >= 300 or response.status_code == 204:
+        return response
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or 'Content-Encoding' in response.headers:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, _Compressor(encoding))
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+        compressor = _Compressor(encoding)
+        response.set_data(compressor.compress(body) + compressor.finish())
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app, api):
+    api.representation('application/json')(output_json)
+    app.after_request(compress)
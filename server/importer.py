@@ -0,0 +1,131 @@
+"""
+Bulk article import from NDJSON: one JSON object per line, the same fields
+CreateArticle takes.
+
+Input is read as a stream and written in batches of IMPORT_BATCH_SIZE rows:
+per batch, one query for the submitters, one for URLs that are already
+posted, and one executemany INSERT, then a commit. Bad lines don't stop the
+import. Each one is reported with its line number and the rest carry on.
+Rows whose URL is already posted, or appears earlier in the same import,
+are counted as duplicates and skipped, as CreateArticle would.
+
+Both POST /import/articles and `flask import-articles FILE` use
+import_articles().
+"""
+import json
+import logging
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from cache import feed_cache
+from config import db
+from models import Article, User
+from urls import url_hash
+
+logger = logging.getLogger(__name__)
+
+# Errors beyond this many are counted but not listed
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "error": message})
+
+    def to_dict(self):
+        return {
+            "imported": self.imported,
+            "duplicates": self.duplicates,
+            "error_count": self.error_count,
+            # Unknown submitters are only found per batch, after later lines' parse errors
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+        }
+
+
+def parse_lines(lines, report):
+    """Yield (line_number, column values) for every valid line, reporting the rest."""
+    for line_number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            report.error(line_number, f"Invalid JSON: {e}")
+            continue
+        values, error = Article.validate_submission(data)
+        if error:
+            report.error(line_number, error)
+            continue
+        values['url_hash'] = url_hash(values['url'])
+        yield line_number, values
+
+
+def _insert(rows):
+    # Core executemany: column defaults (timestamps, counters) still apply per row
+    db.session.execute(db.insert(Article), [values for _, values in rows])
+
+
+def write_batch(batch, report, seen_hashes):
+    user_ids = {values['submitted_by_id'] for _, values in batch}
+    known_users = set(db.session.execute(db.select(User.id).where(User.id.in_(user_ids))).scalars())
+    hashes = {values['url_hash'] for _, values in batch}
+    posted = set(db.session.execute(
+        db.select(Article.url_hash).where(Article.url_hash.in_(hashes))
+    ).scalars())
+
+    rows = []
+    for line_number, values in batch:
+        if values['submitted_by_id'] not in known_users:
+            report.error(line_number, f"Unknown submitted_by_id: {values['submitted_by_id']}")
+        elif values['url_hash'] in posted or values['url_hash'] in seen_hashes:
+            report.duplicates += 1
+        else:
+            seen_hashes.add(values['url_hash'])
+            rows.append((line_number, values))
+    if not rows:
+        return
+
+    try:
+        _insert(rows)
+        db.session.commit()
+        report.imported += len(rows)
+    except SQLAlchemyError:
+        db.session.rollback()
+        # Find the rows at fault rather than losing the whole batch
+        for row in rows:
+            try:
+                _insert([row])
+                db.session.commit()
+                report.imported += 1
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                report.error(row[0], str(getattr(e, 'orig', None) or e))
+
+
+def import_articles(lines, batch_size):
+    """Import NDJSON lines (str or bytes, read lazily) and return an ImportReport."""
+    report = ImportReport()
+    seen_hashes = set()
+    batch = []
+    for row in parse_lines(lines, report):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            write_batch(batch, report, seen_hashes)
+            batch = []
+    if batch:
+        write_batch(batch, report, seen_hashes)
+
+    if report.imported:
+        feed_cache.invalidate()
+    logger.info("Imported %d articles (%d duplicates, %d errors)", report.imported, report.duplicates, report.error_count)
+    return report
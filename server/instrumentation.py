@@ -0,0 +1,155 @@
+"""
+Per-request timing: where a request's time went.
+
+Each request gets a RequestTiming on flask.g. Cursor events on every engine
+count its SQL statements and add up their time. timed() sections add up the
+time spent serializing (the compiled serializers plus app.json, see
+encoding.py) and
+waiting on password hashing. Statements that run inside a serialize section
+are lazy loads and are reported separately as well.
+
+With SERVER_TIMING on, every response carries the totals in a Server-Timing
+header, which browser dev tools show next to the request:
+
+    Server-Timing: sql;dur=4.1;desc="3 statements", lazy;dur=0.0;desc="0 statements",
+        serialize;dur=1.2, password;dur=0.0, app;dur=2.3, total;dur=7.6
+
+app is whatever is left: the resource's own Python code, and fetching rows
+and loading them into objects, since sql only covers executing statements.
+
+Any statement slower than SLOW_QUERY_MS is logged as one line of JSON on the
+"slow_query" logger, with the Resource class that issued it, inside requests
+or not.
+"""
+from contextlib import contextmanager
+import json
+import logging
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import metrics
+
+slow_query_log = logging.getLogger('slow_query')
+
+# Sections timed() knows about, in Server-Timing order
+SECTIONS = ('serialize', 'password')
+
+
+class RequestTiming:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.sql_time = 0.0
+        self.lazy_statements = 0
+        self.lazy_time = 0.0
+        self.sections = dict.fromkeys(SECTIONS, 0.0)
+        self.current = None
+
+    def add_statement(self, elapsed):
+        self.statements += 1
+        self.sql_time += elapsed
+        if self.current == 'serialize':
+            self.lazy_statements += 1
+            self.lazy_time += elapsed
+
+    def server_timing(self):
+        total = time.perf_counter() - self.started
+        # Lazy loads are SQL time, not serialization time
+        sections = dict(self.sections, serialize=max(0.0, self.sections['serialize'] - self.lazy_time))
+        handler = max(0.0, total - self.sql_time - sum(sections.values()))
+        metrics = [
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.statements} statements"',
+            f'lazy;dur={self.lazy_time * 1000:.1f};desc="{self.lazy_statements} statements"',
+            *(f'{name};dur={seconds * 1000:.1f}' for name, seconds in sections.items()),
+            f'app;dur={handler * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ]
+        return ', '.join(metrics)
+
+
+def current_timing():
+    return g.get('timing') if has_request_context() else None
+
+
+@contextmanager
+def timed(section):
+    """Add the time spent in the block (or decorated function) to the request's section."""
+    timing = current_timing()
+    # Nested sections count once, towards the outermost
+    if timing is None or timing.current is not None:
+        yield
+        return
+    timing.current = section
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.sections[section] += time.perf_counter() - start
+        timing.current = None
+
+
+def resource_name():
+    """The Resource class handling the current request, or None outside one."""
+    if not has_request_context() or request.endpoint is None:
+        return None
+    view = current_app.view_functions.get(request.endpoint)
+    view_class = getattr(view, 'view_class', None)
+    return view_class.__name__ if view_class else request.endpoint
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get('query_started') if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def instrument(app):
+    """Install the request hooks and cursor events on app."""
+    threshold = app.config['SLOW_QUERY_MS'] / 1000
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop()
+        timing = current_timing()
+        if timing is not None:
+            timing.add_statement(elapsed)
+        if elapsed >= threshold:
+            slow_query_log.warning(json.dumps({
+                "event": "slow_query",
+                "duration_ms": round(elapsed * 1000, 1),
+                "resource": resource_name(),
+                "method": request.method if has_request_context() else None,
+                "path": request.path if has_request_context() else None,
+                "statement": ' '.join(statement.split()),
+                "executemany": executemany,
+            }))
+
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(Engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def start_timing():
+        g.timing = RequestTiming()
+
+    @app.after_request
+    def record_timing(response):
+        timing = current_timing()
+        if timing is None:
+            return response
+        resource, method = resource_name() or 'unmatched', request.method
+        metrics.http_requests.inc(resource, method, response.status_code)
+        if response.status_code >= 500:
+            metrics.http_errors.inc(resource, method)
+        metrics.http_duration.observe(time.perf_counter() - timing.started, resource, method)
+        metrics.db_statements.inc(resource, amount=timing.statements)
+        metrics.db_seconds.inc(resource, amount=timing.sql_time)
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = timing.server_timing()
+        return response
@@ -0,0 +1,324 @@
+"""
+Prometheus metrics, served in the text exposition format at /metrics.
+
+Counters and histograms are kept in process memory. With a single process
+that's all there is. With several worker processes (gunicorn -w N), set
+METRICS_MULTIPROC_DIR to a directory they all share: every process then
+writes its values to <dir>/metrics-<pid>.json every METRICS_FLUSH_INTERVAL
+seconds and at exit, and /metrics adds up every file in the directory, so
+whichever worker answers the scrape reports the totals for all of them. The
+answering worker's own numbers are always current; the others' lag by at
+most the flush interval. Empty the directory when the service (re)starts,
+before the workers do.
+
+Values that only make sense read live, such as queue depth, are collectors:
+functions run at scrape time by the process answering it.
+
+Everything here is standalone, so config.py can use it before the app
+exists; it calls configure() with the settings.
+"""
+import atexit
+import bisect
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Request and checkout latencies, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+POOL_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Keyed by the label values as passed; they're only encoded for flushes and scrapes
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _check(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {labels}")
+
+    def snapshot(self):
+        """This process's values, keyed by the JSON list of label strings."""
+        with self._lock:
+            values = [(labels, _merge(None, value)) for labels, value in self._values.items()]
+        snapshot = {}
+        for labels, value in values:
+            key = json.dumps([str(label) for label in labels])
+            snapshot[key] = _merge(snapshot.get(key), value)
+        return snapshot
+
+    def reset(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        self._check(labels)
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self, values):
+        for key, value in sorted(values.items()):
+            yield self.name, dict(zip(self.labelnames, json.loads(key))), value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        self._check(labels)
+        # Values above the last bound only count towards +Inf, the sum and the count
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            # Per-bucket (not cumulative) counts, then the sum and the count
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self, values):
+        for key, entry in sorted(values.items()):
+            labels = dict(zip(self.labelnames, json.loads(key)))
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                yield f"{self.name}_bucket", dict(labels, le=_format_value(float(bound))), cumulative
+            yield f"{self.name}_bucket", dict(labels, le='+Inf'), entry[-1]
+            yield f"{self.name}_sum", labels, entry[-2]
+            yield f"{self.name}_count", labels, entry[-1]
+
+
+def _merge(current, value):
+    """Add a counter value or a histogram's bucket list to another, or to None."""
+    if current is None:
+        return list(value) if isinstance(value, list) else value
+    if isinstance(value, list):
+        return [a + b for a, b in zip(current, value)]
+    return current + value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.directory = None
+        self.flush_interval = 5.0
+        self._flusher = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def configure(self, directory=None, flush_interval=5.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+            self._start_flusher()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(self, name, documentation, labelnames, buckets))
+
+    def collector(self, function):
+        """
+        Register function(totals) -> [(name, type, help, [(labels, value), ...]), ...]
+        to run at scrape time; totals are the other metrics' values, as totals() returns.
+        """
+        self.collectors.append(function)
+        return function
+
+    def _add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def _after_fork(self):
+        # A forked worker starts from zero; its parent's counts are the parent's
+        for metric in self.metrics.values():
+            metric.reset()
+        self._flusher = None
+        if self.directory:
+            self._start_flusher()
+
+    def _start_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while os.getpid() == pid:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def snapshot(self):
+        """This process's values of every metric, as flush() writes them."""
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def flush(self):
+        if not self.directory:
+            return
+        snapshot = json.dumps(self.snapshot())
+        path = os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+        # Write then rename, so a scrape never reads half a file
+        fd, temporary = tempfile.mkstemp(dir=self.directory, prefix='.metrics-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(snapshot)
+            os.replace(temporary, path)
+        except OSError:
+            logger.exception("Could not write metrics to %s", path)
+            try:
+                os.unlink(temporary)
+            except OSError:
+                pass
+
+    def totals(self):
+        """Every metric's values, summed across processes when METRICS_MULTIPROC_DIR is set."""
+        if not self.directory:
+            return self.snapshot()
+        self.flush()
+        totals = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path) as f:
+                    values = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, series in values.items():
+                merged = totals.setdefault(name, {})
+                for key, value in series.items():
+                    merged[key] = _merge(merged.get(key), value)
+        return totals
+
+    def render(self):
+        totals = self.totals()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines += _header(name, metric.kind, metric.documentation)
+            for sample_name, labels, value in metric.samples(totals.get(name, {})):
+                lines.append(_sample(sample_name, labels, value))
+        for collect in self.collectors:
+            try:
+                families = collect(totals)
+            except Exception as e:
+                # Usually an unreachable broker; the rest of the scrape is still worth having
+                logger.warning("Metrics collector %s failed: %s", collect.__name__, e)
+                continue
+            for name, kind, documentation, samples in families:
+                lines += _header(name, kind, documentation)
+                lines += [_sample(name, labels, value) for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _header(name, kind, documentation):
+    return [f"# HELP {name} {_escape(documentation)}", f"# TYPE {name} {kind}"]
+
+
+def _sample(name, labels, value):
+    if labels:
+        label_text = ','.join(f'{label}="{_escape(label_value)}"' for label, label_value in labels.items())
+        return f"{name}{{{label_text}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+registry = Registry()
+configure = registry.configure
+collector = registry.collector
+
+http_requests = registry.counter(
+    'pyra_http_requests_total', "Requests handled, by Resource, method and status.",
+    ('resource', 'method', 'status'),
+)
+http_errors = registry.counter(
+    'pyra_http_request_errors_total', "Requests that ended in a 5xx response.", ('resource', 'method'),
+)
+http_duration = registry.histogram(
+    'pyra_http_request_duration_seconds', "Time from the start of a request to its response.",
+    ('resource', 'method'),
+)
+db_statements = registry.counter(
+    'pyra_db_statements_total', "SQL statements executed by requests.", ('resource',),
+)
+db_seconds = registry.counter(
+    'pyra_db_statement_seconds_total', "Time requests spent executing SQL.", ('resource',),
+)
+pool_checkouts = registry.counter(
+    'pyra_db_pool_checkouts_total', "Connections checked out of the pool.",
+)
+pool_checkins = registry.counter(
+    'pyra_db_pool_checkins_total', "Connections returned to the pool; checkouts minus checkins are in use.",
+)
+pool_waits = registry.counter(
+    'pyra_db_pool_waits_total', "Checkouts that found no idle connection and had to open one or wait.",
+)
+pool_checkout_seconds = registry.histogram(
+    'pyra_db_pool_checkout_seconds', "Time taken to get a connection from the pool.", buckets=POOL_BUCKETS,
+)
+cache_hits = registry.counter('pyra_cache_hits_total', "Response cache hits.", ('cache',))
+cache_misses = registry.counter('pyra_cache_misses_total', "Response cache misses.", ('cache',))
+
+
+@collector
+def cache_hit_ratio(totals):
+    hits = {json.loads(key)[0]: value for key, value in totals.get(cache_hits.name, {}).items()}
+    misses = {json.loads(key)[0]: value for key, value in totals.get(cache_misses.name, {}).items()}
+    samples = [
+        ({'cache': cache}, hits.get(cache, 0) / (hits.get(cache, 0) + misses.get(cache, 0)))
+        for cache in sorted(set(hits) | set(misses))
+    ]
+    return [('pyra_cache_hit_ratio', 'gauge', "Hits over lookups since the workers started.", samples)]
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records checkouts, and how long they took, in the metrics above."""
+
+    def connect(self):
+        waited = self.checkedin() == 0
+        start = time.perf_counter()
+        connection = super().connect()
+        pool_checkout_seconds.observe(time.perf_counter() - start)
+        pool_checkouts.inc()
+        if waited:
+            pool_waits.inc()
+        return connection
+
+
+@event.listens_for(MeteredQueuePool, 'checkin')
+def _count_checkin(dbapi_connection, connection_record):
+    pool_checkins.inc()
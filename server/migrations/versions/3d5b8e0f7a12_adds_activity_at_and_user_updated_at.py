@@ -0,0 +1,35 @@
+"""adds article activity_at and user updated_at
+
+Revision ID: 3d5b8e0f7a12
+Revises: e4a07c91d2b8
+Create Date: 2026-10-18 13:20:54.804117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d5b8e0f7a12'
+down_revision = 'e4a07c91d2b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('activity_at', sa.DateTime(), nullable=True))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE article SET activity_at = updated_at")
+    op.execute('UPDATE "user" SET updated_at = created_at')
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
+
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.drop_column('activity_at')
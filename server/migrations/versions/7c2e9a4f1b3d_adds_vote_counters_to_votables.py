@@ -0,0 +1,49 @@
+"""adds vote counters to votables
+
+Revision ID: 7c2e9a4f1b3d
+Revises: 5aa189bbe8a9
+Create Date: 2026-10-18 10:12:41.208316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2e9a4f1b3d'
+down_revision = '5aa189bbe8a9'
+branch_labels = None
+depends_on = None
+
+VOTABLE_TABLES = {
+    'article': 'Article',
+    'comment': 'Comment',
+    'fact_check': 'FactCheck',
+}
+
+
+def upgrade():
+    for table_name, votable_type in VOTABLE_TABLES.items():
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('like_count', sa.Integer(), nullable=False, server_default='0'))
+            batch_op.add_column(sa.Column('dislike_count', sa.Integer(), nullable=False, server_default='0'))
+            batch_op.add_column(sa.Column('vote_score', sa.Integer(), nullable=False, server_default='0'))
+
+        # Backfill from the votes already cast
+        op.execute(f"""
+            UPDATE {table_name} SET
+                like_count = (SELECT COUNT(*) FROM votes
+                    WHERE votes.votable_type = '{votable_type}' AND votes.votable_id = {table_name}.id AND votes.value = 1),
+                dislike_count = (SELECT COUNT(*) FROM votes
+                    WHERE votes.votable_type = '{votable_type}' AND votes.votable_id = {table_name}.id AND votes.value = -1),
+                vote_score = (SELECT COALESCE(SUM(votes.value), 0) FROM votes
+                    WHERE votes.votable_type = '{votable_type}' AND votes.votable_id = {table_name}.id)
+        """)
+
+
+def downgrade():
+    for table_name in VOTABLE_TABLES:
+        with op.batch_alter_table(table_name, schema=None) as batch_op:
+            batch_op.drop_column('vote_score')
+            batch_op.drop_column('dislike_count')
+            batch_op.drop_column('like_count')
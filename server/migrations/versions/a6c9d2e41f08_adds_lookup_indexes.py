@@ -0,0 +1,48 @@
+"""adds lookup indexes
+
+Revision ID: a6c9d2e41f08
+Revises: 3d5b8e0f7a12
+Create Date: 2026-10-18 18:20:41.506213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c9d2e41f08'
+down_revision = '3d5b8e0f7a12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('votes', schema=None) as batch_op:
+        batch_op.create_index('ix_votes_votable', ['votable_type', 'votable_id', 'value', 'user_id'], unique=False)
+
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.create_index('ix_comment_article_id', ['article_id'], unique=False)
+        batch_op.create_index('ix_comment_user_id', ['user_id'], unique=False)
+
+    with op.batch_alter_table('fact_check', schema=None) as batch_op:
+        batch_op.create_index('ix_fact_check_article_id', ['article_id'], unique=False)
+        batch_op.create_index('ix_fact_check_user_id', ['user_id'], unique=False)
+
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.create_index('ix_article_submitted_by_id', ['submitted_by_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.drop_index('ix_article_submitted_by_id')
+
+    with op.batch_alter_table('fact_check', schema=None) as batch_op:
+        batch_op.drop_index('ix_fact_check_user_id')
+        batch_op.drop_index('ix_fact_check_article_id')
+
+    with op.batch_alter_table('comment', schema=None) as batch_op:
+        batch_op.drop_index('ix_comment_user_id')
+        batch_op.drop_index('ix_comment_article_id')
+
+    with op.batch_alter_table('votes', schema=None) as batch_op:
+        batch_op.drop_index('ix_votes_votable')
@@ -0,0 +1,62 @@
+"""adds indexed hot_score to articles
+
+Revision ID: b81f3d2c6e57
+Revises: 7c2e9a4f1b3d
+Create Date: 2026-10-18 11:03:27.551902
+
+"""
+from datetime import datetime
+import math
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81f3d2c6e57'
+down_revision = '7c2e9a4f1b3d'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of models.compute_hotness so the migration doesn't depend on app code
+BASE_TIME = datetime(2025, 1, 1)
+
+
+def compute_hotness(score, created_at):
+    order = math.log(max(abs(score), 1), 10)
+    sign = 1 if score > 0 else -1 if score < 0 else 0
+    seconds = (created_at.replace(tzinfo=None) - BASE_TIME).total_seconds()
+    return round(order + sign * seconds / 45000, 7)
+
+
+def upgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('hot_score', sa.Float(), nullable=False, server_default='0'))
+        batch_op.create_index('ix_article_hot_score', ['hot_score', 'id'], unique=False)
+
+    article = sa.table(
+        'article',
+        sa.column('id', sa.Integer),
+        sa.column('vote_score', sa.Integer),
+        sa.column('created_at', sa.DateTime),
+        sa.column('hot_score', sa.Float),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(sa.select(article.c.id, article.c.vote_score, article.c.created_at)).fetchall()
+    updates = [
+        {'b_id': id, 'b_hot_score': compute_hotness(score, created_at)}
+        for id, score, created_at in rows if created_at is not None
+    ]
+    if updates:
+        bind.execute(
+            article.update()
+            .where(article.c.id == sa.bindparam('b_id'))
+            .values(hot_score=sa.bindparam('b_hot_score')),
+            updates
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.drop_index('ix_article_hot_score')
+        batch_op.drop_column('hot_score')
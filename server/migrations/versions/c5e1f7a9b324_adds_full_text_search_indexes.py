@@ -0,0 +1,62 @@
+"""adds full text search indexes
+
+Revision ID: c5e1f7a9b324
+Revises: a6c9d2e41f08
+Create Date: 2026-10-18 18:41:12.804517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e1f7a9b324'
+down_revision = 'a6c9d2e41f08'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of search.py's DDL, so later edits there don't rewrite history
+SEARCHABLE = {
+    'article': 'title',
+    'comment': 'content',
+    'fact_check': 'content',
+}
+TOKENIZER = 'porter unicode61 remove_diacritics 2'
+
+
+def upgrade():
+    # FTS5 is SQLite only; other databases go without search
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for table, column in SEARCHABLE.items():
+        fts = f"{table}_fts"
+        op.execute(
+            f"CREATE VIRTUAL TABLE {fts} USING fts5("
+            f"{column}, content='{table}', content_rowid='id', tokenize='{TOKENIZER}')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {table}_fts_update AFTER UPDATE OF {column} ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+            f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END"
+        )
+        # Index the rows that already exist
+        op.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    for table in SEARCHABLE:
+        for trigger in ('insert', 'delete', 'update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{trigger}")
+        op.execute(f"DROP TABLE IF EXISTS {table}_fts")
@@ -0,0 +1,26 @@
+"""adds created_at feed index
+
+Revision ID: e4a07c91d2b8
+Revises: b81f3d2c6e57
+Create Date: 2026-10-18 11:48:09.317662
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a07c91d2b8'
+down_revision = 'b81f3d2c6e57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.create_index('ix_article_created_at', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.drop_index('ix_article_created_at')
@@ -0,0 +1,115 @@
+"""adds article url_hash
+
+Revision ID: f2d84b6c1e90
+Revises: c5e1f7a9b324
+Create Date: 2026-10-18 19:02:37.115840
+
+"""
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2d84b6c1e90'
+down_revision = 'c5e1f7a9b324'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# Frozen copy of urls.canonicalize_url so the migration doesn't depend on app code
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    'ref', 'ref_src', 'ref_url', 'cmpid', 'ocid', 'smid', 'sr_share', '_ga', '_hsenc', '_hsmi', 'mkt_tok',
+}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def url_hash(url):
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+    parts = urlsplit(url)
+
+    scheme = parts.scheme.lower()
+    if scheme == 'http':
+        scheme = 'https'
+    host = (parts.hostname or '').lower().rstrip('.')
+    if host.startswith('www.'):
+        host = host[len('www.'):]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+    path = parts.path.rstrip('/')
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not (name.lower() in TRACKING_PARAMS or name.lower().startswith('utm_'))
+    )
+
+    canonical = urlunsplit((scheme, host, path, urlencode(query), ''))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def upgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('url_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_article_url_hash', ['url_hash'], unique=False)
+
+    article = sa.table(
+        'article',
+        sa.column('id', sa.Integer),
+        sa.column('url', sa.String),
+        sa.column('url_hash', sa.String),
+    )
+    update = (
+        article.update()
+        .where(article.c.id == sa.bindparam('b_id'))
+        .values(url_hash=sa.bindparam('b_url_hash'))
+    )
+
+    # Walk the table by id so each batch is one indexed range read and one executemany
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(article.c.id, article.c.url)
+            .where(article.c.id > last_id)
+            .order_by(article.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        bind.execute(update, [
+            {'b_id': id, 'b_url_hash': url_hash(url) if url else None}
+            for id, url in rows
+        ])
+        last_id = rows[-1].id
+
+
+def downgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.drop_index('ix_article_url_hash')
+        batch_op.drop_column('url_hash')
+
+    # Dropping a column makes SQLite batch mode rebuild the table, which loses the
+    # full-text search triggers from c5e1f7a9b324, so put them back
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS article_fts_insert AFTER INSERT ON article BEGIN "
+            "INSERT INTO article_fts(rowid, title) VALUES (new.id, new.title); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS article_fts_delete AFTER DELETE ON article BEGIN "
+            "INSERT INTO article_fts(article_fts, rowid, title) VALUES ('delete', old.id, old.title); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS article_fts_update AFTER UPDATE OF title ON article BEGIN "
+            "INSERT INTO article_fts(article_fts, rowid, title) VALUES ('delete', old.id, old.title); "
+            "INSERT INTO article_fts(rowid, title) VALUES (new.id, new.title); END"
+        )
@@ -1,10 +1,12 @@
 from sqlalchemy_serializer import SerializerMixin
 from datetime import datetime, timezone
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import relationship, foreign
+from sqlalchemy.orm import relationship, foreign, validates
 from sqlalchemy import and_
 from sqlalchemy.ext.declarative import declared_attr
-from config import db, bcrypt
+from config import db
+from passwords import hash_password, check_password, needs_rehash
+from urls import url_hash
 import re
 import math
 
@@ -26,6 +28,16 @@ FACT_CHECK_LEVELS = {
 }
 
 BASE_TIME = datetime(2025,1,1)
+
+# Matches the datetime format SerializerMixin uses, so hand-built payloads look the same
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def compute_hotness(score, created_at):
+    order = math.log(max(abs(score), 1), 10)
+    sign = 1 if score > 0 else -1 if score < 0 else 0
+    seconds = (created_at.replace(tzinfo=None) - BASE_TIME).total_seconds()
+    return round(order + sign * seconds / 45000, 7)
+
 # =====================
 # Mixins
 class TimestampMixin:
@@ -38,8 +50,81 @@ class TimestampMixin:
         result["updated_at"] = self.updated_at.isoformat() if self.updated_at else None
         return result
 
+class ProfileSerializerMixin(SerializerMixin):
+    # Named `only` schemas, filled in below the models. Endpoints pick one by name so
+    # every payload has a fixed set of fields and a fixed relationship depth.
+    serialize_profiles = {}
+
+    def to_dict(self, profile=None, **kwargs):
+        if profile is not None:
+            kwargs['only'] = self.serialize_profiles[profile]
+        return super().to_dict(**kwargs)
+
+class VoteCountMixin:
+    # Denormalized tallies of the votes table, kept in step by Votes.post
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    dislike_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    vote_score = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def score(self):
+        return self.vote_score or 0
+
+    @classmethod
+    def _preserved_columns(cls):
+        # Counter updates shouldn't look like content edits, so keep updated_at as is
+        return {"updated_at": cls.updated_at} if hasattr(cls, "updated_at") else {}
+
+    @classmethod
+    def apply_vote(cls, votable_id, old_value, new_value, refresh_hotness=True):
+        """
+        Shift the counters of one row by the difference between two vote values (-1, 0 or 1)
+        and return the new (like_count, dislike_count), or None if the row doesn't exist.
+        refresh_hotness is for models with a stored hotness, which may defer it to tasks.py.
+        """
+        likes = (new_value == 1) - (old_value == 1)
+        dislikes = (new_value == -1) - (old_value == -1)
+        if not likes and not dislikes:
+            return db.session.execute(
+                db.select(cls.like_count, cls.dislike_count).where(cls.id == votable_id)
+            ).first()
+
+        return db.session.execute(
+            db.update(cls)
+            .where(cls.id == votable_id)
+            .values(
+                like_count=cls.like_count + likes,
+                dislike_count=cls.dislike_count + dislikes,
+                vote_score=cls.vote_score + (new_value - old_value),
+                **cls._preserved_columns()
+            )
+            .returning(cls.like_count, cls.dislike_count)
+        ).first()
+
+    @classmethod
+    def rebuild_vote_counts(cls, ids=None):
+        """Recompute the counters of the given rows (every row when None) from the votes table."""
+        votes = db.select(db.func.count(Vote.id)).where(
+            Vote.votable_type == cls.__name__,
+            Vote.votable_id == cls.id
+        )
+        total = db.select(db.func.coalesce(db.func.sum(Vote.value), 0)).where(
+            Vote.votable_type == cls.__name__,
+            Vote.votable_id == cls.id
+        )
+        update = db.update(cls)
+        if ids is not None:
+            update = update.where(cls.id.in_(ids))
+        db.session.execute(
+            update.values(
+                like_count=votes.where(Vote.value == 1).scalar_subquery(),
+                dislike_count=votes.where(Vote.value == -1).scalar_subquery(),
+                vote_score=total.scalar_subquery(),
+                **cls._preserved_columns()
+            )
+        )
+
 # Models
-class User(db.Model, SerializerMixin):
+class User(db.Model, ProfileSerializerMixin):
     __tablename__ = "user"
 
     id = db.Column(db.Integer, primary_key=True)
@@ -47,6 +132,7 @@ class User(db.Model, SerializerMixin):
     email = db.Column(db.String(64), nullable=False, unique=True)
     _password_hash = db.Column(db.String, nullable=False)
     created_at = db.Column(db.DateTime, default=get_utc_now)
+    updated_at = db.Column(db.DateTime, default=get_utc_now, onupdate=get_utc_now)
 
     submitted_articles = db.relationship('Article', back_populates='submitted_by')
     comments = db.relationship('Comment', back_populates='user', cascade='all, delete-orphan')
@@ -84,11 +170,17 @@ class User(db.Model, SerializerMixin):
             if errors:
                 raise ValueError(''.join(errors))
 
-        password_hash = bcrypt.generate_password_hash(password.encode('utf-8'))
-        self._password_hash = password_hash.decode("utf-8")
+        self._password_hash = hash_password(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self._password_hash, password.encode('utf-8'))
+        return check_password(self._password_hash, password)
+
+    def upgrade_password_hash(self, password):
+        """Rehash at the current BCRYPT_LOG_ROUNDS if needed. Call only after check_password passes."""
+        if needs_rehash(self._password_hash):
+            self._password_hash = hash_password(password)
+            return True
+        return False
 
 
 class Vote(db.Model, SerializerMixin):
@@ -101,6 +193,14 @@ class Vote(db.Model, SerializerMixin):
     value = db.Column(db.Integer, nullable=False)  # 1 or -1
     created_at = db.Column(db.DateTime, default=get_utc_now)
 
+    __table_args__ = (
+        # Created by the voting table migration; votes.record_vote upserts against it.
+        # Leading with user_id, it also serves lookups of one user's votes.
+        db.UniqueConstraint('user_id', 'votable_type', 'votable_id', name='unique_vote_constraint'),
+        # Tallies and counter rebuilds read only these columns, so they never touch the table
+        db.Index('ix_votes_votable', 'votable_type', 'votable_id', 'value', 'user_id'),
+    )
+
     article_votable = db.relationship(
         "Article",
         back_populates="votes",
@@ -131,7 +231,7 @@ class Vote(db.Model, SerializerMixin):
     )
 
 
-class Article(db.Model, SerializerMixin, TimestampMixin):
+class Article(db.Model, ProfileSerializerMixin, TimestampMixin, VoteCountMixin):
     __tablename__ = "article"
 
     id = db.Column(db.Integer, primary_key=True)
@@ -166,22 +266,99 @@ class Article(db.Model, SerializerMixin, TimestampMixin):
         '-votes.article_votable',
     )
 
-    def to_dict(self):
-        data = super().to_dict()
-        data['fact_checks'] = [fc.to_dict() for fc in self.fact_checks]
-        return data
+    hot_score = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    # Bumped by every write that changes the article detail payload: the article itself,
+    # its fact checks and comments, votes on any of them. Serves as its HTTP validator.
+    activity_at = db.Column(db.DateTime, default=get_utc_now)
+    # sha256 of the canonical url (see urls.py), set whenever url is. Bulk inserts that
+    # bypass the ORM have to fill it themselves.
+    url_hash = db.Column(db.String(64), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_article_hot_score', 'hot_score', 'id'),
+        db.Index('ix_article_created_at', 'created_at', 'id'),
+        db.Index('ix_article_submitted_by_id', 'submitted_by_id'),
+        db.Index('ix_article_url_hash', 'url_hash'),
+    )
 
-    def score(self):
-        return sum(v.value for v in self.votes)
-    
-    def hotness(self):
-        score = self.score()
-        order = math.log(max(abs(score), 1), 10)
-        sign = 1 if score > 0 else -1 if score < 0 else 0
-        seconds = (self.created_at - BASE_TIME).total_seconds()
-        return round(order + sign * seconds / 45000, 7)
+    @validates('url')
+    def validate_url(self, key, url):
+        self.url_hash = url_hash(url) if url else None
+        return url
+
+    # Fields a submission must supply, with their column lengths
+    SUBMITTED_FIELDS = {'image_url': 255, 'title': 150, 'url': 255}
+
+    @classmethod
+    def validate_submission(cls, data):
+        """
+        Check a submitted article (CreateArticle, bulk imports). Returns (values, None)
+        with the column values to insert, or (None, error message).
+        """
+        if not isinstance(data, dict):
+            return None, "Expected a JSON object"
+        for field, max_length in cls.SUBMITTED_FIELDS.items():
+            value = data.get(field)
+            if not isinstance(value, str) or not value.strip():
+                return None, f"Invalid or missing field: {field}"
+            if len(value) > max_length:
+                return None, f"{field} must be at most {max_length} characters"
+        submitted_by_id = data.get('submitted_by_id')
+        if not isinstance(submitted_by_id, int) or isinstance(submitted_by_id, bool):
+            return None, "Invalid or missing field: submitted_by_id"
+
+        values = {field: data[field] for field in cls.SUBMITTED_FIELDS}
+        values['submitted_by_id'] = submitted_by_id
+        return values, None
+
+    @classmethod
+    def find_by_url(cls, url):
+        """The earliest article submitted for the same canonical url, or None."""
+        return db.session.execute(
+            db.select(cls).where(cls.url_hash == url_hash(url)).order_by(cls.id).limit(1)
+        ).scalar_one_or_none()
 
-class Comment(db.Model, SerializerMixin, TimestampMixin):
+    def hotness(self):
+        return compute_hotness(self.score(), self.created_at)
+
+    @classmethod
+    def touch(cls, *criteria):
+        """Mark the matching articles' detail payloads as changed."""
+        db.session.execute(
+            db.update(cls).where(*criteria).values(activity_at=get_utc_now(), updated_at=cls.updated_at)
+        )
+
+    @classmethod
+    def apply_vote(cls, votable_id, old_value, new_value, refresh_hotness=True):
+        counts = super().apply_vote(votable_id, old_value, new_value)
+        if refresh_hotness and old_value != new_value:
+            cls.refresh_hot_scores([votable_id])
+        return counts
+
+    @classmethod
+    def refresh_hot_scores(cls, ids=None, batch_size=1000, touch=False):
+        """
+        Recompute the stored hot_score for the given article ids (every article when None).
+        touch also moves their activity_at, as touch() does, in the same UPDATE.
+        """
+        query = db.select(cls.id, cls.vote_score, cls.created_at)
+        if ids is not None:
+            query = query.where(cls.id.in_(ids))
+
+        table = cls.__table__
+        values = {'hot_score': db.bindparam('b_hot_score'), 'updated_at': table.c.updated_at}
+        if touch:
+            values['activity_at'] = get_utc_now()
+        update = db.update(table).where(table.c.id == db.bindparam('b_id')).values(**values)
+
+        rows = db.session.execute(query.execution_options(yield_per=batch_size))
+        for batch in rows.partitions():
+            db.session.execute(update, [
+                {'b_id': id, 'b_hot_score': compute_hotness(score, created_at)}
+                for id, score, created_at in batch
+            ])
+
+class Comment(db.Model, ProfileSerializerMixin, TimestampMixin, VoteCountMixin):
     __tablename__ = "comment"
 
     id = db.Column(db.Integer, primary_key=True)
@@ -189,6 +366,11 @@ class Comment(db.Model, SerializerMixin, TimestampMixin):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
     article_id = db.Column(db.Integer, db.ForeignKey('article.id', ondelete='CASCADE'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_comment_article_id', 'article_id'),
+        db.Index('ix_comment_user_id', 'user_id'),
+    )
+
     user = db.relationship('User', back_populates='comments')
     article = db.relationship('Article', back_populates='comments')
 
@@ -211,16 +393,6 @@ class Comment(db.Model, SerializerMixin, TimestampMixin):
         '-votes.user',
     )
     
-    def to_dict(self):
-        data = super().to_dict()
-        data['user'] = self.user.to_dict() if self.user else None
-        data['article'] = self.article.to_dict() if self.article else None
-        data['votes'] = [v.to_dict() for v in self.votes]
-        return data
-    
-    def score(self):
-        return sum(v.value for v in self.votes)
-    
     def hotness(self):
         score = self.score()
         order = math.log(max(abs(score), 1), 10)
@@ -228,7 +400,7 @@ class Comment(db.Model, SerializerMixin, TimestampMixin):
         return round(order * sign, 7)
 
 
-class FactCheck(db.Model, SerializerMixin):
+class FactCheck(db.Model, ProfileSerializerMixin, VoteCountMixin):
     __tablename__ = "fact_check"
 
     id = db.Column(db.Integer, primary_key=True)
@@ -238,6 +410,11 @@ class FactCheck(db.Model, SerializerMixin):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)
     article_id = db.Column(db.Integer, db.ForeignKey('article.id', ondelete='CASCADE'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_fact_check_article_id', 'article_id'),
+        db.Index('ix_fact_check_user_id', 'user_id'),
+    )
+
     user = db.relationship('User', back_populates='fact_checks')
     article = db.relationship('Article', back_populates='fact_checks')
     votes = db.relationship(
@@ -259,24 +436,81 @@ class FactCheck(db.Model, SerializerMixin):
         '-votes.user',
     )
 
-    def to_dict(self):
-        data = super().to_dict()
-        data['fact_check_level_label'] = self.fact_check_level_label
-        return data
-
     @property
     def fact_check_level_label(self):
         return FACT_CHECK_LEVELS.get(self.fact_check_level, "Unknown")
 
-    def score(self):
-        return sum(v.value for v in self.votes)
-    
     def hotness(self):
         score = self.score()
         order = math.log(max(abs(score), 1), 10)
         sign = 1 if score > 0 else -1 if score < 0 else 0
         return round(order * sign, 7)
 
+VOTABLE_MODELS = {
+    "Article": Article,
+    "Comment": Comment,
+    "FactCheck": FactCheck,
+}
+
+def rebuild_vote_counts():
+    for model in VOTABLE_MODELS.values():
+        model.rebuild_vote_counts()
+    Article.refresh_hot_scores()
+    db.session.commit()
+
+# =====================
+# Serialization profiles
+# =====================
+# embed:   identifying fields only, for nesting inside another object
+# summary: the object's own fields, relations only as ids (lists and write responses)
+# detail:  summary plus direct relations, each at most one level deep
+def nested(relation, fields):
+    return tuple(f"{relation}.{field}" for field in fields)
+
+USER_EMBED = ('id', 'username')
+USER_SUMMARY = USER_EMBED + ('created_at',)
+USER_DETAIL = USER_SUMMARY + ('email',)
+
+VOTE_COUNTS = ('like_count', 'dislike_count', 'vote_score')
+
+ARTICLE_EMBED = ('id', 'title', 'url', 'image_url')
+ARTICLE_FIELDS = ARTICLE_EMBED + ('submitted_by_id', 'created_at', 'updated_at', 'hot_score') + VOTE_COUNTS
+
+FACT_CHECK_EMBED = ('id', 'fact_check_level', 'fact_check_level_label', 'vote_score')
+FACT_CHECK_SUMMARY = FACT_CHECK_EMBED + (
+    'content', 'fact_check_url', 'user_id', 'article_id', 'like_count', 'dislike_count'
+)
+
+COMMENT_EMBED = ('id', 'content', 'user_id')
+COMMENT_SUMMARY = COMMENT_EMBED + ('article_id', 'created_at', 'updated_at') + VOTE_COUNTS
+
+User.serialize_profiles = {
+    'embed': USER_EMBED,
+    'summary': USER_SUMMARY,
+    'detail': USER_DETAIL,
+}
+
+Article.serialize_profiles = {
+    'embed': ARTICLE_EMBED,
+    'summary': ARTICLE_FIELDS + nested('fact_checks', FACT_CHECK_EMBED),
+    'detail': ARTICLE_FIELDS
+        + nested('submitted_by', USER_EMBED)
+        + nested('fact_checks', FACT_CHECK_SUMMARY)
+        + nested('comments', COMMENT_SUMMARY),
+}
+
+Comment.serialize_profiles = {
+    'embed': COMMENT_EMBED,
+    'summary': COMMENT_SUMMARY,
+    'detail': COMMENT_SUMMARY + nested('user', USER_EMBED) + nested('article', ARTICLE_EMBED),
+}
+
+FactCheck.serialize_profiles = {
+    'embed': FACT_CHECK_EMBED,
+    'summary': FACT_CHECK_SUMMARY,
+    'detail': FACT_CHECK_SUMMARY + nested('user', USER_EMBED) + nested('article', ARTICLE_EMBED),
+}
+
 # Uncomment these when ready to use categories
 # class Category(db.Model, SerializerMixin):
 #     __tablename__ = "category"
@@ -0,0 +1,26 @@
+import base64
+import json
+
+
+def encode_cursor(*values):
+    """Pack the sort key of the last row on a page into an opaque, URL-safe token."""
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Unpack a token made by encode_cursor, raising ValueError if it isn't one with `size` values."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def get_page_size(args, default, maximum):
+    limit = args.get('limit', default, type=int)
+    return max(1, min(limit, maximum))
@@ -0,0 +1,73 @@
+"""
+Password hashing off the request threads.
+
+bcrypt is deliberately slow: a few hundred milliseconds of CPU per hash or
+check at the default cost. Run inline, a burst of logins ties up every core
+and article reads queue behind them. Here every hash and check runs on a
+small dedicated pool (PASSWORD_HASH_WORKERS threads; bcrypt releases the GIL,
+so they run in parallel), which caps how much CPU authentication can take
+at once. At most PASSWORD_HASH_QUEUE jobs may be running or waiting. A
+caller waits up to PASSWORD_HASH_WAIT seconds for one of those slots, then
+up to PASSWORD_HASH_TIMEOUT seconds for its job to finish, and gets
+PasswordHashingBusy if either runs out. The resources answer that with 503
+and Retry-After, so a burst of logins holds each serving thread for a
+bounded time rather than for however long the queue takes to drain.
+
+The cost is BCRYPT_LOG_ROUNDS. Hashes made at another cost keep working, and
+Login.post rehashes them at the current one the next time the user signs in,
+or the time after if the pool is busy then; a busy rehash never fails the login.
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import threading
+
+from config import app, bcrypt
+from instrumentation import timed
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when too many password hashes are already running or queued."""
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=app.config['PASSWORD_HASH_WORKERS'],
+    thread_name_prefix="password-hash",
+)
+_slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_QUEUE'])
+
+
+@timed('password')
+def _run(function, *args):
+    if not _slots.acquire(timeout=app.config['PASSWORD_HASH_WAIT']):
+        raise PasswordHashingBusy("Too many password checks in progress")
+    try:
+        future = _executor.submit(function, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+    except FutureTimeoutError:
+        # Drops the job if it hasn't started; one already running keeps its slot until it's done
+        future.cancel()
+        raise PasswordHashingBusy("Password check took too long") from None
+
+
+def hash_password(password):
+    return _run(bcrypt.generate_password_hash, password.encode('utf-8')).decode('utf-8')
+
+
+def check_password(password_hash, password):
+    return _run(bcrypt.check_password_hash, password_hash, password.encode('utf-8'))
+
+
+def hash_cost(password_hash):
+    """The log rounds a bcrypt hash was made with: $2b$12$... -> 12."""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(password_hash):
+    return hash_cost(password_hash) != app.config['BCRYPT_LOG_ROUNDS']
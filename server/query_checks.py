@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Query regression checks for the API.
+
+Runs the app against a throwaway in-memory database and seeds articles of very
+different sizes, then:
+
+  * asserts how many SQL statements each read endpoint issues, so an N+1 or a
+    lost eager load shows up as a failure instead of a slow page;
+  * replays every statement the resources issue, reads and writes, through
+    EXPLAIN QUERY PLAN and fails if any of them scans a whole table, so a
+    dropped index or a query that can't use one fails here rather than
+    once the tables are big;
+  * checks that every foreign key column leads an index, since deleting or
+    rekeying a parent row looks up its children by that column.
+
+    python query_checks.py
+
+tests/test_queries.py runs the same checks under pytest.
+"""
+import os
+import re
+import sys
+
+# Must be set before config.py creates the engine
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from sqlalchemy import event, insert
+
+from app import app
+from cache import feed_cache
+from models import db, User, Article, Comment, FactCheck, Vote, rebuild_vote_counts
+from urls import url_hash
+
+SMALL_ARTICLE_ID = 1
+LARGE_ARTICLE_ID = 2
+
+# (path, maximum number of statements). The article detail budget must hold for
+# both articles, whose comment counts differ by two orders of magnitude: one
+# validator lookup for conditional GETs, then the article, fact checks and comments.
+STATEMENT_BUDGETS = [
+    (f'/article/{SMALL_ARTICLE_ID}', 4),
+    (f'/article/{LARGE_ARTICLE_ID}', 4),
+    ('/articles?sort=hot', 2),
+    ('/articles?sort=new', 2),
+    (f'/votes/Article/{LARGE_ARTICLE_ID}', 1),
+    (f'/votes?items=Article-{SMALL_ARTICLE_ID},Article-{LARGE_ARTICLE_ID},Comment-1,FactCheck-1', 1),
+    ('/users?ids=1,2,3', 1),
+    ('/user/1', 1),
+    # The ranked hits, then the comments' and fact checks' articles, then their titles
+    ('/search?q=comment', 3),
+]
+
+PASSWORD = "Password1"
+
+# (method, path, JSON body) for every resource. Each statement these issue has its
+# plan checked, so the list covers the writes as well as the reads. Order matters:
+# later requests use rows earlier ones create, and the article delete comes last.
+PLAN_REQUESTS = [
+    ('POST', '/login', {"username": "user1", "password": PASSWORD}),
+    ('GET', '/check_session', None),
+    *(('GET', path, None) for path, _ in STATEMENT_BUDGETS),
+    ('GET', '/articles?sort=hot&limit=2', None),
+    ('POST', f'/votes/Article/{LARGE_ARTICLE_ID}', {"user_id": 1, "value": -1}),
+    ('POST', f'/votes/Article/{LARGE_ARTICLE_ID}', {"user_id": 1, "value": 0}),
+    ('POST', '/votes/Comment/1', {"user_id": 1, "value": 1}),
+    ('POST', '/create_article', {"title": "New", "url": "https://example.com/new", "image_url": "https://example.com/new.png", "submitted_by_id": 1}),
+    ('POST', '/create_article', {"title": "Again", "url": "http://www.example.com/1/?utm_source=x", "image_url": "https://example.com/1.png", "submitted_by_id": 2}),
+    ('PATCH', f'/article/{SMALL_ARTICLE_ID}', {"title": "Renamed"}),
+    ('POST', '/create_comment', {"content": "New comment", "user_id": 1, "article_id": SMALL_ARTICLE_ID}),
+    ('PATCH', '/comment/1', {"content": "Edited"}),
+    ('DELETE', '/comment/1', None),
+    ('POST', '/create_fact_check', {"content": "New fact check", "fact_check_level": 2, "user_id": 1, "article_id": SMALL_ARTICLE_ID}),
+    ('PATCH', '/fact_check/1', {"fact_check_level": 3}),
+    ('DELETE', '/fact_check/1', None),
+    ('PATCH', '/user/2', {"username": "renamed2"}),
+    ('DELETE', f'/article/{LARGE_ARTICLE_ID}', None),
+    ('DELETE', '/logout', None),
+]
+
+# "SCAN article" reads the whole table; "SCAN article USING INDEX ..." walks an index
+# in order (the feed's ORDER BY ... LIMIT), "SEARCH ..." is a lookup and
+# "SCAN article_fts VIRTUAL TABLE INDEX ..." is a full-text MATCH, all fine.
+FULL_SCAN = re.compile(r'\bSCAN (?!CONSTANT ROW)(\w+)(?! USING (?:COVERING )?INDEX| VIRTUAL TABLE)(?:\s|$)')
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+
+    db.session.execute(insert(User), [
+        {"id": i, "username": f"user{i}", "email": f"user{i}@example.com", "_password_hash": "x"}
+        for i in range(1, 21)
+    ])
+    # Only the user the plan checks log in as needs a real hash
+    db.session.get(User, 1).password_hash = PASSWORD
+    db.session.execute(insert(Article), [
+        {"id": i, "title": f"Article {i}", "url": f"https://example.com/{i}", "url_hash": url_hash(f"https://example.com/{i}"), "submitted_by_id": i}
+        for i in range(1, 11)
+    ])
+    comment_counts = {SMALL_ARTICLE_ID: 2, LARGE_ARTICLE_ID: 200}
+    db.session.execute(insert(Comment), [
+        {"content": f"Comment {n}", "user_id": n % 20 + 1, "article_id": article_id}
+        for article_id, count in comment_counts.items() for n in range(count)
+    ])
+    db.session.execute(insert(FactCheck), [
+        {"content": f"Fact check {n}", "fact_check_level": n % 5, "user_id": n % 20 + 1, "article_id": article_id}
+        for article_id in range(1, 11) for n in range(3)
+    ])
+    db.session.execute(insert(Vote), [
+        {"user_id": user_id, "votable_type": "Article", "votable_id": article_id, "value": 1 if user_id % 3 else -1}
+        for article_id in range(1, 11) for user_id in range(1, 21)
+    ])
+    db.session.commit()
+    rebuild_vote_counts()
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.statements = []
+        self.parameters = []
+        event.listen(engine, 'before_cursor_execute', self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        # An executemany runs one statement many times; its first row stands in for all
+        self.parameters.append(parameters[0] if executemany else parameters)
+
+    def reset(self):
+        self.statements = []
+        self.parameters = []
+
+
+def check_statement_budgets(client, counter):
+    failures = []
+    for path, budget in STATEMENT_BUDGETS:
+        counter.reset()
+        response = client.get(path)
+        count = len(counter.statements)
+        status = 'ok' if count <= budget and response.status_code == 200 else 'FAIL'
+        print(f"{status:<5}{path:<70}{count:>3} statements (budget {budget}), HTTP {response.status_code}")
+        if status == 'FAIL':
+            failures.append(path)
+            for statement in counter.statements:
+                print(f"       {' '.join(statement.split())[:150]}")
+    return failures
+
+
+def full_scans(connection, statement, parameters):
+    """Tables the statement's query plan reads in full."""
+    if not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE', 'INSERT', 'WITH')):
+        return []
+    cursor = connection.cursor()
+    try:
+        plan = cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    finally:
+        cursor.close()
+    return [match.group(1) for *_, detail in plan for match in FULL_SCAN.finditer(detail)]
+
+
+def check_query_plans(client, counter, engine):
+    failures = []
+    # Plans are read through a raw DBAPI connection, which bypasses the counter's listener
+    connection = engine.raw_connection()
+    try:
+        for method, path, body in PLAN_REQUESTS:
+            counter.reset()
+            response = client.open(path, method=method, json=body)
+            scans = []
+            for statement, parameters in zip(counter.statements, counter.parameters):
+                tables = full_scans(connection, statement, parameters)
+                if tables:
+                    scans.append((tables, statement))
+
+            ok = not scans and response.status_code < 400
+            label = f"{method} {path}"
+            print(f"{'ok' if ok else 'FAIL':<5}{label:<70}{len(counter.statements):>3} statements, HTTP {response.status_code}")
+            if not ok:
+                failures.append(label)
+                for tables, statement in scans:
+                    print(f"       full scan of {', '.join(tables)}: {' '.join(statement.split())[:150]}")
+    finally:
+        connection.close()
+    return failures
+
+
+def unindexed_foreign_keys(connection):
+    """(table, column) for each foreign key that no index on its table starts with."""
+    cursor = connection.cursor()
+    try:
+        tables = [name for name, in cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        ).fetchall()]
+        missing = []
+        for table in tables:
+            leading = set()
+            for _, index, *_ in cursor.execute(f'PRAGMA index_list("{table}")').fetchall():
+                columns = cursor.execute(f'PRAGMA index_info("{index}")').fetchall()
+                leading.add(min(columns)[2])
+            for _, seq, _, column, *_ in cursor.execute(f'PRAGMA foreign_key_list("{table}")').fetchall():
+                if seq == 0 and column not in leading:
+                    missing.append((table, column))
+        return missing
+    finally:
+        cursor.close()
+
+
+def check_foreign_key_indexes(engine):
+    connection = engine.raw_connection()
+    try:
+        missing = unindexed_foreign_keys(connection)
+    finally:
+        connection.close()
+    for table, column in missing:
+        print(f"FAIL {table}.{column} is a foreign key without an index")
+    return [f"{table}.{column}" for table, column in missing]
+
+
+def main():
+    with app.app_context():
+        seed()
+        engine = db.engine
+    # Requests run outside that app context so each gets its own, and its own session, as in production
+    counter = StatementCounter(engine)
+    client = app.test_client()
+    budget_failures = check_statement_budgets(client, counter)
+    print()
+    # Cached feed pages skip the database, and these checks need to see the queries
+    feed_cache.invalidate()
+    plan_failures = check_query_plans(client, counter, engine)
+    plan_failures += check_foreign_key_indexes(engine)
+
+    if budget_failures:
+        print(f"\n{len(budget_failures)} endpoint(s) over their statement budget")
+    if plan_failures:
+        print(f"\n{len(plan_failures)} request(s) or foreign key(s) with full table scans or errors")
+    if budget_failures or plan_failures:
+        return 1
+    print("\nAll endpoints within their statement budgets and using indexes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Read/write routing between the primary database and its read replicas.
+
+db.session is a RoutingSession. Statements bound for the default database go
+to a replica when all of these hold:
+
+  * they run inside a GET/HEAD/OPTIONS request,
+  * this session hasn't written anything yet,
+  * the client hasn't written within the last DATABASE_STICKY_SECONDS.
+
+Everything else, including CLI commands and background tasks, goes to the
+primary. The last rule handles read-after-write: replicas lag, so once a
+client writes, its session cookie pins its reads to the primary until the
+replicas have had time to catch up. A session keeps one replica for its
+whole life, so a request doesn't mix snapshots from replicas that lag by
+different amounts.
+
+Replicas are extra SQLALCHEMY_BINDS entries listed in DATABASE_REPLICAS.
+Keeping them in sync is the database's job (streaming replication, or a
+copied/Litestream-restored file for SQLite); nothing here writes to them.
+"""
+import random
+import time
+
+from flask import current_app, has_request_context, request, session as client_session
+from flask_sqlalchemy.session import Session
+
+READ_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+# Key in the (signed cookie) Flask session holding the time until which reads stay on the primary
+STICKY_KEY = '_db_primary_until'
+
+
+class RoutingSession(Session):
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self._wrote = False
+        self._replica = None
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        # Explicit binds and models on other bind keys aren't replicated
+        if bind is not None or engine is not self._db.engines.get(None):
+            return engine
+
+        if self._flushing or (clause is not None and getattr(clause, 'is_dml', False)):
+            self._mark_write()
+        if self._wrote or not self._reads_from_replica():
+            return engine
+        return self._replica_engine()
+
+    def _mark_write(self):
+        if self._wrote:
+            return
+        self._wrote = True
+        # Without replicas there's nothing to pin, and no reason to send every writer a cookie
+        if current_app.config['DATABASE_REPLICAS'] and has_request_context():
+            client_session[STICKY_KEY] = time.time() + current_app.config['DATABASE_STICKY_SECONDS']
+
+    def _reads_from_replica(self):
+        if not current_app.config['DATABASE_REPLICAS'] or not has_request_context():
+            return False
+        if request.method not in READ_METHODS:
+            return False
+        return client_session.get(STICKY_KEY, 0) < time.time()
+
+    def _replica_engine(self):
+        if self._replica is None:
+            self._replica = random.choice(current_app.config['DATABASE_REPLICAS'])
+        return self._db.engines[self._replica]
@@ -0,0 +1,149 @@
+"""
+Full-text search over articles, comments and fact checks (SQLite FTS5).
+
+Each searchable table gets an external-content FTS5 index, <table>_fts. The
+index only stores the inverted index and reads the text from the table
+itself. Triggers on the table keep it in step on every insert, update and
+delete, so writers don't have to remember it. A MATCH query walks the
+inverted index, so lookups stay in the milliseconds however many rows there
+are, where LIKE '%q%' reads every row.
+
+db.create_all() creates the indexes through the after_create hook at the
+bottom of this file. Existing databases get them from the migration that
+added search, which also backfills them. SQLite drops a table's triggers
+along with the table, so a migration whose batch mode rebuilds one of these
+tables (dropping or altering a column) has to recreate its triggers.
+
+Results are ranked by bm25 across all three tables and paged with a keyset
+cursor on (rank, type, id). Only the newest SEARCH_CANDIDATES matches in each
+table are ranked, so a query matching half of a million comments costs about
+the same as one matching a dozen. On a news site those are the ones people
+are looking for anyway.
+"""
+import html
+import re
+
+from sqlalchemy import event
+
+from config import db
+
+# table -> indexed text column
+SEARCHABLE = {
+    'article': 'title',
+    'comment': 'content',
+    'fact_check': 'content',
+}
+
+# Porter stemming over unicode61, so "voting" finds "votes"
+TOKENIZER = 'porter unicode61 remove_diacritics 2'
+
+# snippet() marks matches with these private-use characters, which can't occur in
+# stored text; they become <mark> tags only after the rest has been HTML-escaped
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+SNIPPET_TOKENS = 16
+
+# Ranking scores every candidate, so only the newest matches in each table are ranked.
+# That keeps a query as common as "the" as fast as a rare one.
+SEARCH_CANDIDATES = 2000
+
+
+def fts_table(table):
+    return f"{table}_fts"
+
+
+def search_index_ddl(table, column):
+    fts = fts_table(table)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{column}, content='{table}', content_rowid='id', tokenize='{TOKENIZER}')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF {column} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+        f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END",
+    ]
+
+
+def create_search_indexes(connection, rebuild=False):
+    for table, column in SEARCHABLE.items():
+        for statement in search_index_ddl(table, column):
+            connection.exec_driver_sql(statement)
+        if rebuild:
+            # Re-reads every row of the content table
+            fts = fts_table(table)
+            connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def drop_search_indexes(connection):
+    # Triggers too, so a bulk load can drop the indexes, insert, then rebuild them once
+    for table in SEARCHABLE:
+        for action in ('insert', 'delete', 'update'):
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_fts_{action}")
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {fts_table(table)}")
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _after_create(metadata, connection, **kwargs):
+    if connection.dialect.name == 'sqlite':
+        create_search_indexes(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _before_drop(metadata, connection, **kwargs):
+    if connection.dialect.name == 'sqlite':
+        drop_search_indexes(connection)
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 query that can't be a syntax error: every word
+    quoted, all of them required, the last one as a prefix so partly typed
+    words match. Returns None if there's nothing to search for.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _branch(table):
+    fts = fts_table(table)
+    # FTS5 walks matches in rowid order cheaply, so finding the newest candidates is
+    # fast; bm25() and snippet() then only run for rows at or above the oldest of them
+    newest = (
+        f"SELECT coalesce(min(rowid), 0) FROM (SELECT rowid FROM {fts} WHERE {fts} MATCH :match "
+        f"ORDER BY rowid DESC LIMIT {SEARCH_CANDIDATES})"
+    )
+    return (
+        f"SELECT '{table}' AS type, rowid AS id, bm25({fts}) AS rank, "
+        f"snippet({fts}, 0, :mark_start, :mark_end, '…', {SNIPPET_TOKENS}) AS snippet "
+        f"FROM {fts} WHERE {fts} MATCH :match AND rowid >= ({newest})"
+    )
+
+
+def search(match, types, limit, after=None):
+    """
+    One page of hits as (type, id, rank, snippet) rows, best first; bm25 ranks
+    are negative, lower is better. types are SEARCHABLE tables, and after is the
+    (rank, type, id) of the last hit on the previous page.
+    """
+    union = ' UNION ALL '.join(_branch(table) for table in types)
+    where = "WHERE (rank, type, id) > (:rank, :type, :id)" if after else ""
+    statement = db.text(
+        f"SELECT type, id, rank, snippet FROM ({union}) {where} "
+        f"ORDER BY rank, type, id LIMIT :limit"
+    )
+    params = {"match": match, "limit": limit, "mark_start": MARK_START, "mark_end": MARK_END}
+    if after:
+        params.update(rank=after[0], type=after[1], id=after[2])
+    return db.session.execute(statement, params).all()
+
+
+def highlight(snippet):
+    escaped = html.escape(snippet or '')
+    return escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
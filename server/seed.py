@@ -1,121 +1,279 @@
 #!/usr/bin/env python3
+"""
+Seed the database with a synthetic dataset of any size.
 
+    python seed.py                                   # small development dataset
+    python seed.py --users 50000 --articles 200000 --comments 2000000 \
+        --fact-checks 300000 --votes 5000000 --seed 7
+
+Drops and recreates every table, then writes rows with bulk Core inserts in
+chunks of --chunk-size, building the search indexes once at the end rather
+than row by row. The same --seed always produces the same data.
+
+Popularity is skewed the way it is in production: a few articles collect
+most of the comments, fact checks and votes, and a few users do most of the
+posting (Zipf, exponent --skew). Every user gets the same password, hashed
+once: DEFAULT_PASSWORD.
+"""
 # Standard library imports
-from random import randint, choice as rc
+import argparse
+import itertools
+import random
+import time
+from datetime import timedelta
 
 # Remote library imports
 from faker import Faker
 
 # Local imports
 from app import app
-from models import db, User, Article, Comment, FactCheck, Vote
-from datetime import datetime
-
-fake = Faker()
-
-# Create sample users
-def create_users():
-    users = []
-    for i in range(10):
-        user = User(
-            username=fake.user_name(),
-            email=fake.email()
-        )
-        user.password_hash = f"Password{i}"  # Uses the secure setter
-        users.append(user)
-
-    db.session.add_all(users)
-    db.session.commit()
-    return users
-
-# Create sample articles
-def create_articles(users):
-    articles = [
-        Article(
-            title="Bystander Becomes ‘Lifesaver’ Leaping into Ocean When Bull Shark Bites Swimmer Off Deserted Beach",
-            url="https://www.goodnewsnetwork.org/bystander-becomes-lifesaver-leaping-into-ocean-when-bull-shark-bites-swimmer-off-deserted-beach/",
-            image_url="https://www.goodnewsnetwork.org/wp-content/uploads/2025/05/A-bull-shark-in-the-Bahamas-public-domain-696x385.jpg",
-            submitted_by_id=rc(users).id
-        ),
-        Article(
-            title="Perpetually-Smiling Endangered Amphibian Now Thrives in Artificial Wetlands in Mexico City",
-            url="https://www.goodnewsnetwork.org/perpetually-smiling-endangered-amphibian-now-thrives-in-artificial-wetlands-in-mexico-city/",
-            image_url="https://www.goodnewsnetwork.org/wp-content/uploads/2025/05/A-captive-bred-leucistic-Axolotl-credit-LaDame-Bucolique-via-Pixabay-e1746429396644-696x416.jpg",
-            submitted_by_id=rc(users).id
-        ),
-        Article(
-            title="Woman Hires Private Detective and Finds 2 Long-Lost Sisters After 44 Years and the Death of Adoptive Parents",
-            url="https://www.goodnewsnetwork.org/woman-hires-private-detective-and-found-2-long-lost-sisters-after-44-years-and-death-of-adoptive-parents/",
-            image_url="https://www.goodnewsnetwork.org/wp-content/uploads/2025/05/Magda-Berg-with-her-two-sisters-Beata-and-Daria-via-SWNS--696x374.jpg",
-            submitted_by_id=rc(users).id
-        ),
-        Article(
-            title="Pollen Replacement Food for Honey Bees Brings New Hope for Struggling Colonies and the Crops They Support",
-            url="https://www.goodnewsnetwork.org/pollen-replacement-food-for-honey-bees-brings-new-hope-for-struggling-colonies-and-the-crops-they-support/",
-            image_url="https://www.goodnewsnetwork.org/wp-content/uploads/2025/05/Honey-beekeeper-inspects-colony-Photo-credit-College-of-Agricultural-Human-and-Natural-Resource-Sciences%E2%80%93WSU--696x375.jpg",
-            submitted_by_id=rc(users).id
-        ),
-    ]
-    
-    # Add more articles if needed
-    for article in articles:
-        add_votes_for_articles(article)
-
-
-    
-    db.session.add_all(articles)
-    db.session.commit()
-    return articles
-
-
-def add_votes_for_articles(article):
-    # Ensure fact_check is added to the session before using its ID
-    db.session.add(article)
-    db.session.flush()  # This will flush the fact_check object to the database and assign it an ID
-
-    # Random number of upvotes and downvotes
-    num_upvotes = randint(5, 15)  # Upvotes between 5 and 15
-    num_downvotes = randint(0, 5)  # Downvotes between 0 and 5
-    
-    # Create upvotes
-    for _ in range(num_upvotes):
-        vote = Vote(
-            votable_id=article.id, 
-            votable_type='Article', 
-            value=1, 
-            user_id=rc([user.id for user in User.query.all()])
-        )
-        db.session.add(vote)
-
-    # Create downvotes
-    for _ in range(num_downvotes):
-        vote = Vote(
-            votable_id=article.id, 
-            votable_type='Article', 
-            value=-1, 
-            user_id=rc([user.id for user in User.query.all()])
-        )
-        db.session.add(vote)
-
-    db.session.commit()  # Commit all the votes
-
-# Main function to run the seed script
-def run_seed():
+from models import db, User, Article, Comment, FactCheck, Vote, get_utc_now, rebuild_vote_counts
+from passwords import hash_password
+from search import create_search_indexes, drop_search_indexes
+from urls import url_hash
+
+DEFAULT_PASSWORD = "Password1"
+
+# A few real articles so a small development database looks like the site
+SAMPLE_ARTICLES = [
+    (
+        "Bystander Becomes ‘Lifesaver’ Leaping into Ocean When Bull Shark Bites Swimmer Off Deserted Beach",
+        "https://www.goodnewsnetwork.org/bystander-becomes-lifesaver-leaping-into-ocean-when-bull-shark-bites-swimmer-off-deserted-beach/",
+        "https://www.goodnewsnetwork.org/wp-content/uploads/2025/05/A-bull-shark-in-the-Bahamas-public-domain-696x385.jpg",
+    ),
+    (
+        "Perpetually-Smiling Endangered Amphibian Now Thrives in Artificial Wetlands in Mexico City",
+        "https://www.goodnewsnetwork.org/perpetually-smiling-endangered-amphibian-now-thrives-in-artificial-wetlands-in-mexico-city/",
+        "https://www.goodnewsnetwork.org/wp-content/uploads/2025/05/A-captive-bred-leucistic-Axolotl-credit-LaDame-Bucolique-via-Pixabay-e1746429396644-696x416.jpg",
+    ),
+    (
+        "Woman Hires Private Detective and Finds 2 Long-Lost Sisters After 44 Years and the Death of Adoptive Parents",
+        "https://www.goodnewsnetwork.org/woman-hires-private-detective-and-found-2-long-lost-sisters-after-44-years-and-death-of-adoptive-parents/",
+        "https://www.goodnewsnetwork.org/wp-content/uploads/2025/05/Magda-Berg-with-her-two-sisters-Beata-and-Daria-via-SWNS--696x374.jpg",
+    ),
+    (
+        "Pollen Replacement Food for Honey Bees Brings New Hope for Struggling Colonies and the Crops They Support",
+        "https://www.goodnewsnetwork.org/pollen-replacement-food-for-honey-bees-brings-new-hope-for-struggling-colonies-and-the-crops-they-support/",
+        "https://www.goodnewsnetwork.org/wp-content/uploads/2025/05/Honey-beekeeper-inspects-colony-Photo-credit-College-of-Agricultural-Human-and-Natural-Resource-Sciences%E2%80%93WSU--696x375.jpg",
+    ),
+]
+
+DOMAINS = ["example-news.com", "dailyplanet.test", "goodnews.test", "worldwire.test", "localpaper.test"]
+
+
+class Generator:
+    def __init__(self, seed, skew, days):
+        self.rng = random.Random(seed)
+        fake = Faker()
+        fake.seed_instance(seed)
+        # Faker is far too slow to call per row at this scale, so draw text from a fixed vocabulary
+        self.words = fake.words(nb=500, unique=True)
+        self.skew = skew
+        self.now = get_utc_now().replace(tzinfo=None, microsecond=0)
+        self.start = self.now - timedelta(days=days)
+
+    def zipf_weights(self, n):
+        """Cumulative weights for picking among n items, where the item at rank r gets 1 / r**skew."""
+        return list(itertools.accumulate(1 / rank ** self.skew for rank in range(1, n + 1)))
+
+    def popular(self, ids, weights, k):
+        return self.rng.choices(ids, cum_weights=weights, k=k)
+
+    def ranked(self, ids):
+        """The ids in a random popularity order, so popularity isn't tied to age."""
+        ids = list(ids)
+        self.rng.shuffle(ids)
+        return ids
+
+    def sentence(self, low, high):
+        return ' '.join(self.rng.choices(self.words, k=self.rng.randint(low, high))).capitalize()
+
+    def time_after(self, earliest):
+        return earliest + (self.now - earliest) * self.rng.random() ** 2
+
+
+def insert_chunks(model, rows, chunk_size):
+    count = 0
+    for chunk in iter(lambda: list(itertools.islice(rows, chunk_size)), []):
+        db.session.execute(db.insert(model), chunk)
+        db.session.commit()
+        count += len(chunk)
+    return count
+
+
+def generate_users(gen, count):
+    password_hash = hash_password(DEFAULT_PASSWORD)
+    for i in range(1, count + 1):
+        created_at = gen.start + (gen.now - gen.start) * (i / count) / 2
+        yield {
+            "id": i,
+            "username": f"{gen.rng.choice(gen.words)[:20]}{i}",
+            "email": f"user{i}@example.com",
+            "_password_hash": password_hash,
+            "created_at": created_at,
+            "updated_at": created_at,
+        }
+
+
+def generate_articles(gen, count, user_ids):
+    posters = gen.ranked(user_ids)
+    weights = gen.zipf_weights(len(posters))
+    span = gen.now - gen.start
+    for i in range(1, count + 1):
+        # Spread evenly over the period in id order, as real submissions would be
+        created_at = gen.start + span * (i / count)
+        if i <= len(SAMPLE_ARTICLES):
+            title, url, image_url = SAMPLE_ARTICLES[i - 1]
+        else:
+            title = gen.sentence(4, 12)[:150]
+            url = f"https://{gen.rng.choice(DOMAINS)}/{created_at:%Y/%m}/{'-'.join(title.lower().split()[:6])}-{i}"
+            image_url = f"https://images.example.com/{i}.jpg"
+        yield {
+            "id": i,
+            "title": title,
+            "url": url,
+            "url_hash": url_hash(url),
+            "image_url": image_url,
+            "submitted_by_id": gen.popular(posters, weights, 1)[0],
+            "created_at": created_at,
+            "updated_at": created_at,
+            "activity_at": created_at,
+        }
+
+
+def generate_children(gen, count, articles, user_ids, make_row):
+    """Rows attached to articles, most of them on the most popular articles."""
+    article_ids = gen.ranked(articles)
+    article_weights = gen.zipf_weights(len(article_ids))
+    authors = gen.ranked(user_ids)
+    author_weights = gen.zipf_weights(len(authors))
+    for i in range(1, count + 1):
+        article_id = gen.popular(article_ids, article_weights, 1)[0]
+        created_at = gen.time_after(articles[article_id])
+        yield make_row(i, article_id, gen.popular(authors, author_weights, 1)[0], created_at)
+
+
+def generate_votes(gen, count, votables, user_count):
+    """
+    Spread count votes over (votable_type, id) pairs with Zipf-sized shares. Each
+    votable draws its voters without replacement, so no user votes twice on it.
+    """
+    ranked = gen.ranked(votables)
+    weights = [1 / rank ** gen.skew for rank in range(1, len(ranked) + 1)]
+    total = sum(weights)
+    remaining = count
+    for (votable_type, votable_id, created_at), weight in zip(ranked, weights):
+        if remaining <= 0:
+            break
+        share = min(remaining, user_count, max(1, round(count * weight / total)))
+        remaining -= share
+        # Each votable has its own approval rate, so scores differ as well as counts
+        approval = gen.rng.betavariate(4, 1.5)
+        for user_id in gen.rng.sample(range(1, user_count + 1), share):
+            yield {
+                "user_id": user_id,
+                "votable_type": votable_type,
+                "votable_id": votable_id,
+                "value": 1 if gen.rng.random() < approval else -1,
+                "created_at": gen.time_after(created_at),
+            }
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    count = func(*args)
+    print(f"  {label:<12}{count:>10,} rows in {time.perf_counter() - start:6.1f}s")
+
+
+def run_seed(args):
+    gen = Generator(args.seed, args.skew, args.days)
+    chunk = args.chunk_size
+
     with app.app_context():
         print("Seeding database...")
-
-        # Drop all tables
         db.drop_all()
-
-        # Create all tables
         db.create_all()
+        # Indexing each row as it lands doubles the insert time; build the search indexes once at the end
+        sqlite = db.engine.dialect.name == 'sqlite'
+        if sqlite:
+            with db.engine.begin() as connection:
+                drop_search_indexes(connection)
+
+        user_ids = range(1, args.users + 1)
+        timed("users", insert_chunks, User, generate_users(gen, args.users), chunk)
+
+        articles = {}
+
+        def article_rows():
+            for row in generate_articles(gen, args.articles, user_ids):
+                articles[row["id"]] = row["created_at"]
+                yield row
+
+        timed("articles", insert_chunks, Article, article_rows(), chunk)
+
+        comments = {}
+
+        def comment_row(i, article_id, user_id, created_at):
+            comments[i] = created_at
+            return {"id": i, "content": gen.sentence(5, 40)[:1000], "user_id": user_id,
+                    "article_id": article_id, "created_at": created_at, "updated_at": created_at}
+
+        fact_checks = {}
+
+        def fact_check_row(i, article_id, user_id, created_at):
+            fact_checks[i] = created_at
+            return {"id": i, "content": gen.sentence(10, 60)[:2000], "fact_check_level": gen.rng.randint(0, 4),
+                    "fact_check_url": f"https://factcheck.example.com/{i}", "user_id": user_id,
+                    "article_id": article_id}
+
+        timed("comments", insert_chunks, Comment,
+              generate_children(gen, args.comments, articles, user_ids, comment_row), chunk)
+        timed("fact checks", insert_chunks, FactCheck,
+              generate_children(gen, args.fact_checks, articles, user_ids, fact_check_row), chunk)
+
+        votables = [
+            (votable_type, votable_id, created_at)
+            for votable_type, rows in (('Article', articles), ('Comment', comments), ('FactCheck', fact_checks))
+            for votable_id, created_at in rows.items()
+        ]
+        timed("votes", insert_chunks, Vote, generate_votes(gen, args.votes, votables, args.users), chunk)
+
+        # Votes were inserted directly, so bring the counters and hot scores in line
+        start = time.perf_counter()
+        rebuild_vote_counts()
+        print(f"  {'counters':<12}{'':>10} rebuilt in {time.perf_counter() - start:6.1f}s")
+
+        if sqlite:
+            start = time.perf_counter()
+            with db.engine.begin() as connection:
+                create_search_indexes(connection, rebuild=True)
+            print(f"  {'search':<12}{'':>10} rebuilt in {time.perf_counter() - start:6.1f}s")
+
+        print(f"Database seeded successfully! Every user's password is {DEFAULT_PASSWORD}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--articles", type=int, default=len(SAMPLE_ARTICLES))
+    parser.add_argument("--comments", type=int, default=20)
+    parser.add_argument("--fact-checks", type=int, default=8)
+    parser.add_argument("--votes", type=int, default=60)
+    parser.add_argument("--days", type=int, default=30, help="How far back the data goes.")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for popularity.")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed; the same seed gives the same data.")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows per INSERT and commit.")
+    return parser
+
 
-        # Populate with data
-        users = create_users()
-        articles = create_articles(users)
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.users < 1 or args.articles < 1:
+        parser.error("--users and --articles must be at least 1")
+    run_seed(args)
 
-        print("Database seeded successfully!")
 
 # Run the seed function
 if __name__ == "__main__":
-    run_seed()
+    main()
@@ -0,0 +1,145 @@
+"""
+Fast-path serializers for the profiles declared in models.py.
+
+SerializerMixin.to_dict rebuilds its schema and inspects the model on every
+call. Here each (model, profile) pair is compiled once, at import time, into a
+plain function that reads the attributes it needs and builds the dict
+directly. Output matches to_dict(profile) exactly; bench_serializers.py checks
+that and measures the difference.
+"""
+from datetime import date, datetime
+
+from sqlalchemy import inspect as sql_inspect
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+
+from instrumentation import timed
+from models import User, Article, Comment, FactCheck, DATETIME_FORMAT
+
+DATE_FORMAT = "%Y-%m-%d"
+
+# model -> profile name -> compiled function
+SERIALIZERS = {}
+
+# model -> profile name -> loader options that fetch everything the profile reads
+LOADERS = {}
+
+
+def _format_datetime(value):
+    return value.strftime(DATETIME_FORMAT) if value is not None else None
+
+
+def _format_date(value):
+    return value.strftime(DATE_FORMAT) if value is not None else None
+
+
+def _split_fields(fields):
+    """('id', 'user.id', 'user.username') -> (['id'], {'user': ['id', 'username']})"""
+    own, relations = [], {}
+    for field in fields:
+        head, _, rest = field.partition('.')
+        if rest:
+            relations.setdefault(head, []).append(rest)
+        elif head not in own:
+            own.append(head)
+    return own, relations
+
+
+def _value_expression(model, field, namespace):
+    column = sql_inspect(model).columns.get(field)
+    python_type = None
+    if column is not None:
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            pass
+
+    if python_type is datetime:
+        namespace['_format_datetime'] = _format_datetime
+        return f"_format_datetime(obj.{field})"
+    if python_type is date:
+        namespace['_format_date'] = _format_date
+        return f"_format_date(obj.{field})"
+    return f"obj.{field}"
+
+
+def compile_serializer(model, fields, name=None):
+    """Build a function obj -> dict for an `only` schema like the ones in serialize_profiles."""
+    own, relations = _split_fields(fields)
+    mapper = sql_inspect(model)
+    namespace = {}
+    items = []
+
+    for field in own:
+        if not field.isidentifier():
+            raise ValueError(f"Cannot compile field {field!r} of {model.__name__}")
+        items.append(f"{field!r}: {_value_expression(model, field, namespace)}")
+
+    for relation, sub_fields in relations.items():
+        prop = mapper.relationships[relation]
+        child = compile_serializer(prop.mapper.class_, sub_fields)
+        child_name = f"_serialize_{relation}"
+        namespace[child_name] = child
+        if prop.uselist:
+            items.append(f"{relation!r}: [{child_name}(item) for item in obj.{relation}]")
+        else:
+            items.append(
+                f"{relation!r}: {child_name}(obj.{relation}) if obj.{relation} is not None else None"
+            )
+
+    function_name = name or f"serialize_{model.__name__.lower()}"
+    source = f"def {function_name}(obj):\n    return {{{', '.join(items)}}}\n"
+    exec(compile(source, f"<serializer {model.__name__}>", "exec"), namespace)
+    return namespace[function_name]
+
+
+def compile_loader_options(model, fields, parent=None):
+    """
+    Eager-load every relation an `only` schema reads: selectinload for collections
+    (one extra IN query each), joinedload for many-to-one. Anything else raises
+    instead of lazy loading, so a profile that outgrows its loaders fails loudly.
+    """
+    _, relations = _split_fields(fields)
+    mapper = sql_inspect(model)
+    options = []
+
+    for relation, sub_fields in relations.items():
+        prop = mapper.relationships[relation]
+        attribute = getattr(model, relation)
+        if parent is None:
+            loader = selectinload(attribute) if prop.uselist else joinedload(attribute)
+        else:
+            loader = parent.selectinload(attribute) if prop.uselist else parent.joinedload(attribute)
+        options.append(loader)
+        options.extend(compile_loader_options(prop.mapper.class_, sub_fields, loader))
+
+    if parent is None:
+        options.append(raiseload('*'))
+    return options
+
+
+def loader_options(model, profile):
+    return LOADERS[model][profile]
+
+
+@timed('serialize')
+def serialize(obj, profile):
+    return SERIALIZERS[type(obj)][profile](obj)
+
+
+@timed('serialize')
+def serialize_many(objs, profile):
+    if not objs:
+        return []
+    serializer = SERIALIZERS[type(objs[0])][profile]
+    return [serializer(obj) for obj in objs]
+
+
+for _model in (User, Article, Comment, FactCheck):
+    SERIALIZERS[_model] = {
+        profile: compile_serializer(_model, fields, f"serialize_{_model.__name__.lower()}_{profile}")
+        for profile, fields in _model.serialize_profiles.items()
+    }
+    LOADERS[_model] = {
+        profile: compile_loader_options(_model, fields)
+        for profile, fields in _model.serialize_profiles.items()
+    }
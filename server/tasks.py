@@ -1,24 +1,192 @@
-from celery import Celery
+"""
+Background score recomputation.
+
+With SCORE_RECOMPUTE=celery, Votes.post still moves the like/dislike counters
+inline (a single-row UPDATE) but leaves hot_score alone. It records the
+votable as dirty and makes sure one recompute_scores task is scheduled
+SCORE_RECOMPUTE_DEBOUNCE seconds out. However many votes land in that window,
+that one task drains the dirty set in batches and fixes every row touched
+with a few set-based UPDATEs, so a burst of votes on a viral article is one
+task rather than thousands.
+
+The dirty set and the "already scheduled" flag live in Valkey when the broker
+is Valkey/Redis, and in process memory otherwise (the memory:// broker used
+for tests and local runs).
+"""
+import threading
 import time
-from server.models import db, Article, User, Comment, FactCheck, Vote
-from server.app import create_app
 
-# Initialize Celery
+from celery import Celery
+
+from cache import feed_cache
+from config import app, db
+import metrics
+from models import Article, VOTABLE_MODELS
+
+
+def redis_scheme(url):
+    """kombu and redis-py speak Valkey's protocol but don't know the valkey:// scheme."""
+    if url and url.startswith('valkey://'):
+        return 'redis://' + url[len('valkey://'):]
+    return url
+
+
 celery = Celery(
     "tasks",
-    broker="valkey://localhost:6379/0",   # Changed from redis:// to valkey://
-    backend="valkey://localhost:6379/0"   # Changed from redis:// to valkey://
+    broker=redis_scheme(app.config['CELERY_BROKER_URL']),
+    backend=redis_scheme(app.config['CELERY_RESULT_BACKEND']),
 )
+celery.conf.update(
+    task_always_eager=app.config['CELERY_TASK_ALWAYS_EAGER'],
+    task_ignore_result=True,
+)
+
+
+class MemoryDirtySet:
+    def __init__(self):
+        self._keys = set()
+        self._scheduled_until = 0
+        self._lock = threading.Lock()
+
+    def add(self, key):
+        with self._lock:
+            self._keys.add(key)
+
+    def drain(self, count):
+        with self._lock:
+            return [self._keys.pop() for _ in range(min(count, len(self._keys)))]
+
+    def claim_schedule(self, ttl):
+        with self._lock:
+            now = time.monotonic()
+            if self._scheduled_until > now:
+                return False
+            self._scheduled_until = now + ttl
+            return True
+
+    def release_schedule(self):
+        with self._lock:
+            self._scheduled_until = 0
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class ValkeyDirtySet:
+    KEYS = "scores:dirty"
+    SCHEDULED = "scores:scheduled"
+
+    def __init__(self, client):
+        self.client = client
+
+    def add(self, key):
+        self.client.sadd(self.KEYS, key)
+
+    def drain(self, count):
+        return [key.decode('utf-8') for key in self.client.spop(self.KEYS, count) or []]
+
+    def claim_schedule(self, ttl):
+        # The flag expires on its own, so a lost task can't block scheduling forever
+        return bool(self.client.set(self.SCHEDULED, 1, nx=True, ex=max(1, int(ttl * 2))))
+
+    def release_schedule(self):
+        self.client.delete(self.SCHEDULED)
+
+    def __len__(self):
+        return self.client.scard(self.KEYS)
+
+
+def make_dirty_set(broker_url):
+    if broker_url.startswith(('valkey://', 'redis://')):
+        import redis
+
+        return ValkeyDirtySet(redis.Redis.from_url(redis_scheme(broker_url)))
+    return MemoryDirtySet()
+
+
+dirty_votables = make_dirty_set(app.config['CELERY_BROKER_URL'])
+
+
+def score_recompute_deferred():
+    return app.config['SCORE_RECOMPUTE'] == 'celery'
+
+
+def mark_dirty(votable_type, votable_id):
+    """Queue a votable for recomputation, scheduling a task unless one is already pending."""
+    dirty_votables.add(f"{votable_type}:{votable_id}")
+    debounce = app.config['SCORE_RECOMPUTE_DEBOUNCE']
+    if dirty_votables.claim_schedule(debounce):
+        try:
+            recompute_scores.apply_async(countdown=debounce)
+        except Exception:
+            # The votable stays in the dirty set; let the next vote try to schedule it
+            dirty_votables.release_schedule()
+            raise
+
+
+def recompute_batch(keys):
+    ids_by_type = {}
+    for key in keys:
+        votable_type, _, votable_id = key.partition(':')
+        if votable_type in VOTABLE_MODELS:
+            ids_by_type.setdefault(votable_type, set()).add(int(votable_id))
+
+    for votable_type, ids in ids_by_type.items():
+        votable_model = VOTABLE_MODELS[votable_type]
+        votable_model.rebuild_vote_counts(ids)
+        if votable_model is not Article:
+            # Comment and fact check tallies are part of their article's detail payload
+            Article.touch(Article.id.in_(db.select(votable_model.article_id).where(votable_model.id.in_(ids))))
+    if 'Article' in ids_by_type:
+        # Moves activity_at too, so ArticleById's ETag stops matching the old scores
+        Article.refresh_hot_scores(ids_by_type['Article'], touch=True)
+    db.session.commit()
+    feed_cache.invalidate()
 
-# Optional Flask context, useful if you're touching the DB inside tasks
-flask_app = create_app()
 
 @celery.task
-def update_score(post_id):
-    with flask_app.app_context():  # Ensures we are in the Flask app context
-        time.sleep(5)  # Delay to allow for batching votes
-        post = Post.query.get(post_id)
-        if post:
-            post.score = post.calculate_score()  # Your model's method for calculating score
-            db.session.commit()
-            print(f"Score updated for post {post_id}: {post.score}")
+def recompute_scores():
+    # Release first: votes arriving from here on schedule a follow-up run
+    dirty_votables.release_schedule()
+    batch_size = app.config['SCORE_RECOMPUTE_BATCH_SIZE']
+    processed = 0
+
+    with app.app_context():
+        while True:
+            keys = dirty_votables.drain(batch_size)
+            if not keys:
+                break
+            recompute_batch(keys)
+            processed += len(keys)
+
+    return processed
+
+
+# Seconds a scrape waits for the broker before giving up on the queue depth
+QUEUE_DEPTH_TIMEOUT = 0.5
+
+
+def celery_queue_depth(totals):
+    # A passive declare returns the message count without creating the queue
+    queue = celery.conf.task_default_queue
+    with celery.connection_for_read(
+        connect_timeout=QUEUE_DEPTH_TIMEOUT,
+        transport_options={'socket_connect_timeout': QUEUE_DEPTH_TIMEOUT, 'socket_timeout': QUEUE_DEPTH_TIMEOUT},
+    ) as connection:
+        # No retries: a broker that's down fails this collector, not the whole scrape
+        connection.ensure_connection(max_retries=0)
+        try:
+            depth = connection.default_channel.queue_declare(queue=queue, passive=True).message_count
+        except connection.channel_errors:
+            # Brokers only create the queue with the first task sent to it
+            depth = 0
+    return [
+        ('pyra_celery_queue_depth', 'gauge', "Tasks waiting in the Celery queue.", [({'queue': queue}, depth)]),
+        ('pyra_score_recompute_pending', 'gauge', "Votables waiting for their scores to be recomputed.",
+         [({}, len(dirty_votables))]),
+    ]
+
+
+if score_recompute_deferred():
+    # With inline recomputation nothing is ever queued, so there's no broker to ask
+    metrics.collector(celery_queue_depth)
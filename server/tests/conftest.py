@@ -0,0 +1,63 @@
+"""
+Shared test setup.
+
+config.py reads its settings from the environment when it's imported, so they
+are set here, before anything imports app: a throwaway primary database file
+with a replica file next to it, the score pipeline on Celery's in-memory
+broker with tasks run eagerly, and the cheapest bcrypt cost.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+DATABASE_DIR = tempfile.mkdtemp(prefix='pyra-tests-')
+PRIMARY_PATH = os.path.join(DATABASE_DIR, 'primary.db')
+REPLICA_PATH = os.path.join(DATABASE_DIR, 'replica.db')
+
+os.environ.update({
+    'DB_PROFILE': 'sqlite',
+    'DATABASE_URL': f'sqlite:///{PRIMARY_PATH}',
+    'DATABASE_REPLICA_URLS': f'sqlite:///{REPLICA_PATH}',
+    'CELERY_BROKER_URL': 'memory://',
+    'CELERY_TASK_ALWAYS_EAGER': '1',
+    'BCRYPT_LOG_ROUNDS': '4',
+})
+
+import pytest
+
+from app import app
+from cache import feed_cache, session_cache
+from models import db
+import query_checks
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(DATABASE_DIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def primary_only(monkeypatch):
+    """Every read goes to the primary unless a test turns the replica on."""
+    monkeypatch.setitem(app.config, 'DATABASE_REPLICAS', [])
+
+
+@pytest.fixture
+def database():
+    """query_checks.py's dataset, freshly seeded."""
+    with app.app_context():
+        query_checks.seed()
+        engine = db.engine
+    feed_cache.invalidate()
+    session_cache.invalidate()
+    return engine
+
+
+@pytest.fixture
+def client(database):
+    # Requests reuse an app context that's already pushed, so tests only push one around
+    # their own database access; each request then gets its own session, as in production.
+    return app.test_client()
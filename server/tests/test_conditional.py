@@ -0,0 +1,31 @@
+"""
+The ETags built from version columns: they're read as UTC, so every host
+hands out the same ones whatever its TZ.
+"""
+import time
+
+import pytest
+
+ARTICLE_ID = 1
+USER_ID = 1
+
+
+@pytest.fixture
+def set_timezone(monkeypatch):
+    def set_timezone(name):
+        monkeypatch.setenv('TZ', name)
+        time.tzset()
+
+    yield set_timezone
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.skipif(not hasattr(time, 'tzset'), reason="needs time.tzset")
+@pytest.mark.parametrize('path', [f'/article/{ARTICLE_ID}', f'/user/{USER_ID}'])
+def test_etags_dont_depend_on_the_host_timezone(client, set_timezone, path):
+    etags = []
+    for name in ('UTC', 'America/New_York', 'Asia/Kolkata'):
+        set_timezone(name)
+        etags.append(client.get(path).headers['ETag'])
+    assert len(set(etags)) == 1
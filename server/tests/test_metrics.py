@@ -0,0 +1,74 @@
+"""
+metrics.py: what /metrics reports, and how the values of several worker
+processes add up.
+"""
+import os
+
+import pytest
+
+import metrics
+import tasks
+
+ARTICLE_ID = 1
+
+
+def sample(text, line_start):
+    """The value of the first exposition line starting with line_start."""
+    for line in text.splitlines():
+        if line.startswith(line_start):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def test_requests_show_up_at_metrics(client):
+    before = client.get('/metrics').get_data(as_text=True)
+    client.get(f'/article/{ARTICLE_ID}')
+    after = client.get('/metrics').get_data(as_text=True)
+
+    requests = 'pyra_http_requests_total{resource="ArticleById",method="GET",status="200"}'
+    duration = 'pyra_http_request_duration_seconds_count{resource="ArticleById",method="GET"}'
+    assert sample(after, requests) == sample(before, requests) + 1
+    assert sample(after, duration) == sample(before, duration) + 1
+    assert sample(after, 'pyra_db_pool_checkouts_total') > sample(before, 'pyra_db_pool_checkouts_total')
+
+
+def test_histogram_buckets():
+    registry = metrics.Registry()
+    histogram = registry.histogram('latency', "Latency.", ('resource',), buckets=(1, 2))
+    for value in (0.5, 1, 2, 9):
+        histogram.observe(value, 'Articles')
+
+    assert registry.totals() == {'latency': {'["Articles"]': [2, 1, 12.5, 4]}}
+    assert 'latency_bucket{resource="Articles",le="2.0"} 3' in registry.render()
+
+
+def test_labels_are_checked():
+    counter = metrics.Registry().counter('requests', "Requests.", ('resource', 'method'))
+    with pytest.raises(ValueError):
+        counter.inc('Articles')
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork")
+def test_workers_start_from_zero_and_add_up(tmp_path):
+    registry = metrics.Registry()
+    counter = registry.counter('requests', "Requests.", ('resource',))
+    registry.configure(str(tmp_path), flush_interval=60)
+    counter.inc('Articles')
+
+    pid = os.fork()
+    if pid == 0:
+        # The parent's count isn't the worker's, only what it counts itself
+        status = 0 if registry.snapshot() == {'requests': {}} else 1
+        counter.inc('Articles', amount=2)
+        registry.flush()
+        os._exit(status)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.WEXITSTATUS(status) == 0
+    assert registry.totals() == {'requests': {'["Articles"]': 3}}
+
+
+def test_inline_recompute_doesnt_ask_the_broker(client):
+    # conftest.py leaves SCORE_RECOMPUTE at inline, so nothing is ever queued
+    assert tasks.celery_queue_depth not in metrics.registry.collectors
+    assert 'pyra_celery_queue_depth' not in client.get('/metrics').get_data(as_text=True)
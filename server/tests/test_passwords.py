@@ -0,0 +1,85 @@
+"""
+passwords.py under load: when the hashing pool is full, or a hash takes too
+long, the request is answered 503 with Retry-After instead of waiting.
+"""
+import threading
+
+import pytest
+
+from app import app
+import models
+from models import User, db
+import passwords
+from query_checks import PASSWORD
+
+LOGIN = {"username": "user1", "password": PASSWORD}
+
+
+@pytest.fixture
+def busy_workers():
+    """Every hashing thread stuck on a job until the test ends."""
+    release = threading.Event()
+    # Without a working timeout the request would wait for these; fail rather than hang
+    safety = threading.Timer(5, release.set)
+    safety.start()
+    blockers = [
+        passwords._executor.submit(release.wait)
+        for _ in range(app.config['PASSWORD_HASH_WORKERS'])
+    ]
+    yield
+    release.set()
+    safety.cancel()
+    for blocker in blockers:
+        blocker.result()
+
+
+def assert_busy(response):
+    assert response.status_code == 503, response.get_data(as_text=True)
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_login(client):
+    assert client.post('/login', json=LOGIN).status_code == 200
+
+
+def test_busy_rehash_doesnt_fail_the_login(client, monkeypatch):
+    # The stored hash is at BCRYPT_LOG_ROUNDS 4, so this cost makes the login try to upgrade it
+    monkeypatch.setitem(app.config, 'BCRYPT_LOG_ROUNDS', 5)
+    attempts = []
+
+    def busy(password):
+        attempts.append(password)
+        raise passwords.PasswordHashingBusy("Too many password checks in progress")
+
+    monkeypatch.setattr(models, 'hash_password', busy)
+    with app.app_context():
+        stored_hash = db.session.get(User, 1)._password_hash
+
+    assert client.post('/login', json=LOGIN).status_code == 200
+    assert attempts == [PASSWORD]
+    with app.app_context():
+        # Left as it was, to be upgraded at the next login
+        assert db.session.get(User, 1)._password_hash == stored_hash
+
+
+def test_full_queue_answers_503(client, monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(passwords, '_slots', slots)
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_WAIT', 0.01)
+
+    assert_busy(client.post('/login', json=LOGIN))
+    assert_busy(client.post('/signup', json={
+        "username": "newuser", "email": "new@example.com",
+        "password": PASSWORD, "password_confirmation": PASSWORD,
+    }))
+
+
+def test_slow_hash_answers_503_and_frees_its_slot(client, monkeypatch, busy_workers):
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_TIMEOUT', 0.05)
+    slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_QUEUE'])
+    monkeypatch.setattr(passwords, '_slots', slots)
+
+    assert_busy(client.post('/login', json=LOGIN))
+    # The queued check was cancelled, so its slot is back straight away
+    assert all(slots.acquire(blocking=False) for _ in range(app.config['PASSWORD_HASH_QUEUE']))
@@ -0,0 +1,73 @@
+"""
+query_checks.py under pytest. Statement budgets for the read endpoints: an
+N+1 or a lost eager load fails here instead of showing up as a slow page.
+Query plans for every resource and an index behind every foreign key: a
+dropped index fails here instead of once the tables are big.
+"""
+import pytest
+from sqlalchemy import event, text
+
+from app import app
+from models import db
+from query_checks import (
+    LARGE_ARTICLE_ID, SMALL_ARTICLE_ID, STATEMENT_BUDGETS, StatementCounter,
+    check_foreign_key_indexes, check_query_plans,
+)
+
+# Created by migration a6c9d2e41f08
+LOOKUP_INDEXES = [
+    'ix_votes_votable',
+    'ix_comment_article_id',
+    'ix_comment_user_id',
+    'ix_fact_check_article_id',
+    'ix_fact_check_user_id',
+    'ix_article_submitted_by_id',
+]
+
+
+@pytest.fixture
+def counter(database):
+    counter = StatementCounter(database)
+    yield counter
+    event.remove(database, 'before_cursor_execute', counter._record)
+
+
+def statements_for(client, counter, path):
+    counter.reset()
+    response = client.get(path)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return counter.statements
+
+
+@pytest.mark.parametrize('path, budget', STATEMENT_BUDGETS)
+def test_statement_budget(client, counter, path, budget):
+    statements = statements_for(client, counter, path)
+    assert len(statements) <= budget, '\n'.join(' '.join(statement.split()) for statement in statements)
+
+
+def test_article_detail_statements_dont_grow_with_comments(client, counter):
+    # 2 comments against 200: the detail graph is loaded in the same number of queries
+    small = statements_for(client, counter, f'/article/{SMALL_ARTICLE_ID}')
+    large = statements_for(client, counter, f'/article/{LARGE_ARTICLE_ID}')
+    assert len(small) == len(large)
+
+
+def plan_failures(client, counter, engine):
+    return check_query_plans(client, counter, engine) + check_foreign_key_indexes(engine)
+
+
+def test_query_plans_use_indexes(client, counter, database):
+    assert plan_failures(client, counter, database) == []
+
+
+@pytest.mark.parametrize('index', LOOKUP_INDEXES)
+def test_dropping_a_lookup_index_fails_the_checks(client, counter, database, index):
+    with app.app_context():
+        db.session.execute(text(f'DROP INDEX {index}'))
+        db.session.commit()
+    # Pooled connections keep their prepared statements, and an EXPLAIN never notices the schema change
+    database.dispose()
+    try:
+        assert plan_failures(client, counter, database)
+    finally:
+        database.dispose()
@@ -0,0 +1,105 @@
+"""
+routing.RoutingSession with a replica: a copy of the primary's SQLite file,
+which then falls behind because nothing writes to it. Without one, writes
+leave the session cookie alone.
+"""
+import sqlite3
+import time
+
+import pytest
+from sqlalchemy import event
+
+from app import app
+from conftest import PRIMARY_PATH, REPLICA_PATH
+from models import db
+
+ARTICLE_ID = 1
+
+
+class EngineLog:
+    """Which databases the statements went to."""
+
+    def __init__(self, engines):
+        self.used = set()
+        self._listeners = [(engine, self._recorder(name)) for name, engine in engines.items()]
+        for engine, listener in self._listeners:
+            event.listen(engine, 'before_cursor_execute', listener)
+
+    def _recorder(self, name):
+        def record(*args):
+            self.used.add(name)
+        return record
+
+    def reset(self):
+        self.used = set()
+
+    def remove(self):
+        for engine, listener in self._listeners:
+            event.remove(engine, 'before_cursor_execute', listener)
+
+
+@pytest.fixture
+def replica(database, monkeypatch):
+    source, target = sqlite3.connect(PRIMARY_PATH), sqlite3.connect(REPLICA_PATH)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+    monkeypatch.setitem(app.config, 'DATABASE_REPLICAS', ['replica_1'])
+    with app.app_context():
+        engines = {'primary': db.engines[None], 'replica': db.engines['replica_1']}
+    log = EngineLog(engines)
+    yield log
+    log.remove()
+
+
+def read_title(client):
+    response = client.get(f'/article/{ARTICLE_ID}')
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()['title']
+
+
+def rename(client, title):
+    response = client.patch(f'/article/{ARTICLE_ID}', json={"title": title})
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+
+def test_reads_go_to_the_replica(client, replica):
+    read_title(client)
+    assert replica.used == {'replica'}
+
+
+def test_a_write_pins_its_client_to_the_primary(client, replica):
+    rename(client, "Renamed")
+    assert replica.used == {'primary'}
+
+    # The writer reads its own write; the replica hasn't seen it
+    replica.reset()
+    assert read_title(client) == "Renamed"
+    assert replica.used == {'primary'}
+
+    # Everyone else still reads the replica
+    replica.reset()
+    assert read_title(app.test_client()) == f"Article {ARTICLE_ID}"
+    assert replica.used == {'replica'}
+
+
+def test_the_pin_lasts_for_the_sticky_window(client, replica, monkeypatch):
+    monkeypatch.setitem(app.config, 'DATABASE_STICKY_SECONDS', 0.2)
+    rename(client, "Renamed")
+    replica.reset()
+    read_title(client)
+    assert replica.used == {'primary'}
+
+    time.sleep(0.3)
+    replica.reset()
+    assert read_title(client) == f"Article {ARTICLE_ID}"
+    assert replica.used == {'replica'}
+
+
+def test_writes_without_replicas_set_no_cookie(client):
+    response = client.post(f'/votes/Article/{ARTICLE_ID}', json={"user_id": 1, "value": -1})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert 'Set-Cookie' not in response.headers
+    assert 'Cookie' not in response.headers.get('Vary', '')
@@ -0,0 +1,102 @@
+"""
+The SCORE_RECOMPUTE=celery pipeline on the memory:// broker, with tasks run
+eagerly (see conftest.py).
+"""
+import pytest
+
+from cache import feed_cache
+from models import Article, compute_hotness, db
+import tasks
+
+ARTICLE_ID = 3
+
+
+class RecordingTask:
+    """Stands in for recompute_scores, recording what would have been queued."""
+
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+
+    def apply_async(self, **options):
+        self.calls.append(options)
+        if self.error:
+            raise self.error
+
+
+@pytest.fixture
+def deferred(client, monkeypatch):
+    monkeypatch.setitem(tasks.app.config, 'SCORE_RECOMPUTE', 'celery')
+    tasks.dirty_votables.drain(len(tasks.dirty_votables))
+    tasks.dirty_votables.release_schedule()
+    yield
+    tasks.dirty_votables.drain(len(tasks.dirty_votables))
+    tasks.dirty_votables.release_schedule()
+
+
+def vote(client, user_id, value, article_id=ARTICLE_ID):
+    response = client.post(f'/votes/Article/{article_id}', json={"user_id": user_id, "value": value})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response
+
+
+def stored(article_id=ARTICLE_ID):
+    with tasks.app.app_context():
+        return db.session.get(Article, article_id)
+
+
+def test_votes_in_a_window_enqueue_one_task(client, deferred, monkeypatch):
+    recorder = RecordingTask()
+    monkeypatch.setattr(tasks, 'recompute_scores', recorder)
+
+    for user_id in (3, 6, 9):
+        vote(client, user_id, 1)
+    vote(client, 3, 1, article_id=ARTICLE_ID + 1)
+
+    assert recorder.calls == [{"countdown": tasks.app.config['SCORE_RECOMPUTE_DEBOUNCE']}]
+    assert len(tasks.dirty_votables) == 2
+
+
+def test_recompute_reconciles_counters_and_hot_score(client, deferred, monkeypatch):
+    monkeypatch.setattr(tasks, 'recompute_scores', RecordingTask())
+    vote(client, 3, 1)
+    # Drift the counters and the stored score so the task has something to fix
+    with tasks.app.app_context():
+        db.session.execute(db.update(Article).where(Article.id == ARTICLE_ID).values(like_count=0, hot_score=0))
+        db.session.commit()
+    etag = client.get(f'/article/{ARTICLE_ID}').headers['ETag']
+    version = feed_cache.version()
+
+    monkeypatch.undo()
+    monkeypatch.setitem(tasks.app.config, 'SCORE_RECOMPUTE', 'celery')
+    assert tasks.recompute_scores.apply().get() == 1
+
+    article = stored()
+    assert (article.like_count, article.dislike_count, article.vote_score) == (15, 5, 10)
+    assert article.hot_score == pytest.approx(compute_hotness(article.vote_score, article.created_at))
+    assert feed_cache.version() > version
+    # activity_at moved with the scores, so the old ETag no longer matches
+    assert client.get(f'/article/{ARTICLE_ID}', headers={"If-None-Match": etag}).status_code == 200
+    assert len(tasks.dirty_votables) == 0
+
+
+def test_eager_pipeline_recomputes_inline(client, deferred):
+    before = stored().hot_score
+    vote(client, 3, 1)
+
+    article = stored()
+    assert article.vote_score == 10
+    assert article.hot_score == pytest.approx(compute_hotness(10, article.created_at))
+    assert article.hot_score != before
+
+
+def test_enqueue_failure_keeps_the_vote(client, deferred, monkeypatch):
+    failing = RecordingTask(error=ConnectionError("broker down"))
+    monkeypatch.setattr(tasks, 'recompute_scores', failing)
+    vote(client, 3, 1)
+    assert stored().like_count == 15
+
+    # The debounce flag was released, so the next vote tries again
+    vote(client, 6, 1)
+    assert len(failing.calls) == 2
+    assert len(tasks.dirty_votables) == 1
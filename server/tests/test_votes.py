@@ -0,0 +1,124 @@
+"""
+Votes.post through votes.record_vote: every transition between no vote, a
+like and a dislike moves the counters by exactly the difference. With
+VOTE_WRITE_BEHIND on, the same votes go through votes.VoteBuffer instead.
+"""
+import pytest
+
+from app import app
+from models import Comment, Vote, db
+from votes import VoteBuffer
+
+COMMENT_ID = 1
+USER_ID = 1
+
+
+def vote(client, value, user_id=USER_ID, comment_id=COMMENT_ID, status=200):
+    response = client.post(f'/votes/Comment/{comment_id}', json={"user_id": user_id, "value": value})
+    assert response.status_code == status, response.get_data(as_text=True)
+    body = response.get_json()
+    return body["likes"], body["dislikes"]
+
+
+def stored_counts(comment_id=COMMENT_ID):
+    with app.app_context():
+        comment = db.session.get(Comment, comment_id)
+        return comment.like_count, comment.dislike_count, comment.vote_score
+
+
+@pytest.mark.parametrize('values, expected', [
+    ([1], (1, 0)),
+    ([1, 1], (1, 0)),
+    ([1, -1], (0, 1)),
+    ([-1, 1, -1], (0, 1)),
+    ([1, 0], (0, 0)),
+    ([0], (0, 0)),
+    ([-1, 0, 1], (1, 0)),
+])
+def test_vote_transitions(client, values, expected):
+    for value in values:
+        counts = vote(client, value)
+    assert counts == expected
+    likes, dislikes = expected
+    assert stored_counts() == (likes, dislikes, likes - dislikes)
+
+
+def test_counters_match_the_votes_table(client):
+    for user_id, value in [(1, 1), (2, -1), (3, 1), (1, -1), (2, 0), (4, 1), (3, 1)]:
+        vote(client, value, user_id=user_id)
+    counters = stored_counts()
+    with app.app_context():
+        Comment.rebuild_vote_counts([COMMENT_ID])
+        db.session.commit()
+    assert stored_counts() == counters == (2, 1, 1)
+
+
+def test_flipping_a_vote_without_created_at(client):
+    # Votes from before created_at was filled in have it NULL
+    with app.app_context():
+        db.session.execute(db.insert(Vote).values(
+            user_id=USER_ID, votable_type='Comment', votable_id=COMMENT_ID, value=1, created_at=None,
+        ))
+        Comment.rebuild_vote_counts([COMMENT_ID])
+        db.session.commit()
+
+    assert vote(client, -1) == (0, 1)
+    assert stored_counts() == (0, 1, -1)
+
+
+@pytest.fixture
+def buffer(client, monkeypatch):
+    """Write-behind on, with a buffer that only flushes when the test says so."""
+    monkeypatch.setitem(app.config, 'VOTE_WRITE_BEHIND', True)
+    buffer = VoteBuffer(interval=3600)
+    monkeypatch.setattr('app.vote_buffer', buffer)
+    return buffer
+
+
+def queue_vote(client, value, user_id=USER_ID):
+    return vote(client, value, user_id=user_id, status=202)
+
+
+def test_queued_votes_are_written_at_flush(client, buffer):
+    assert queue_vote(client, 1) == (1, 0)
+    assert stored_counts() == (0, 0, 0)
+
+    assert buffer.flush() == 1
+    assert len(buffer) == 0
+    assert stored_counts() == (1, 0, 1)
+
+
+def test_a_changed_vote_in_one_window_is_written_once(client, buffer):
+    queue_vote(client, 1)
+    assert queue_vote(client, -1) == (0, 1)
+    assert len(buffer) == 1
+
+    assert buffer.flush() == 1
+    assert stored_counts() == (0, 1, -1)
+    with app.app_context():
+        comment_votes = db.select(Vote.value).where(Vote.votable_type == 'Comment', Vote.votable_id == COMMENT_ID)
+        assert db.session.scalars(comment_votes).all() == [-1]
+
+
+def test_a_vote_from_a_missing_user_is_dropped_at_flush(client, buffer):
+    queue_vote(client, 1)
+    # Votes.post doesn't look the user up, so the foreign key only fails when the batch is written
+    queue_vote(client, 1, user_id=9999)
+
+    assert buffer.flush() == 1
+    assert buffer.dropped == 1
+    assert stored_counts() == (1, 0, 1)
+
+
+def test_projected_counts_include_other_queued_votes(client, buffer):
+    assert queue_vote(client, 1, user_id=1) == (1, 0)
+    assert queue_vote(client, 1, user_id=2) == (2, 0)
+    assert queue_vote(client, -1, user_id=3) == (2, 1)
+    # A user changing their queued vote replaces it rather than adding to it
+    assert queue_vote(client, -1, user_id=1) == (1, 2)
+
+    buffer.flush()
+    assert stored_counts() == (1, 2, -1)
+    # Against stored votes now: user 1's stored dislike becomes a like, user 4 adds one
+    assert queue_vote(client, 1, user_id=1) == (2, 1)
+    assert queue_vote(client, 1, user_id=4) == (3, 1)
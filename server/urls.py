@@ -0,0 +1,67 @@
+"""
+URL canonicalization for duplicate article detection.
+
+Two submissions are the same story when their URLs canonicalize to the same
+string. Article.url keeps exactly what the user submitted; only the hash of
+the canonical form is stored, in the indexed Article.url_hash column, so
+looking up a duplicate is one index probe however long the URL is.
+
+The canonical form is for comparison only and is never fetched, which is why
+it can drop things that may matter to the server: www., http vs https,
+tracking parameters.
+"""
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only say where a click came from
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    'ref', 'ref_src', 'ref_url', 'cmpid', 'ocid', 'smid', 'sr_share', '_ga', '_hsenc', '_hsmi', 'mkt_tok',
+}
+TRACKING_PREFIXES = ('utm_',)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def _is_tracking(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize_url(url):
+    """
+    'HTTP://WWW.Example.com:80/News/Story/?utm_source=x&b=2&a=1#top'
+        -> 'https://example.com/News/Story?a=1&b=2'
+    """
+    url = url.strip()
+    if '://' not in url:
+        url = 'https://' + url
+    parts = urlsplit(url)
+
+    scheme = parts.scheme.lower()
+    if scheme == 'http':
+        scheme = 'https'
+
+    host = (parts.hostname or '').lower().rstrip('.')
+    if host.startswith('www.'):
+        host = host[len('www.'):]
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+
+    # Paths are case sensitive, so only the trailing slash goes
+    path = parts.path.rstrip('/')
+
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking(name)
+    )
+
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+def url_hash(url):
+    return hashlib.sha256(canonicalize_url(url).encode('utf-8')).hexdigest()
@@ -0,0 +1,300 @@
+"""
+Vote writes.
+
+record_vote() stores a vote without reading it first, and learns the value it
+replaced from the write itself. On PostgreSQL that's one upsert against
+unique_vote_constraint returning whether the row was inserted (xmax = 0). On
+SQLite it's an INSERT ... ON CONFLICT DO NOTHING, then, if there was a vote
+already, an UPDATE of it if it was the opposite one; the INSERT takes
+SQLite's write lock, so nothing can slip in between the two, and a new vote,
+the usual case, is one statement. A value of 0 is a DELETE ... RETURNING.
+The counters then move with one UPDATE ... RETURNING that hands back the new
+tallies. Two concurrent votes from the same user can no longer both try to
+INSERT, so double clicks stop turning into IntegrityErrors.
+
+With VOTE_WRITE_BEHIND=1, Votes.post doesn't write at all. It queues the vote
+in vote_buffer, answers 202 with projected tallies, and a background thread
+writes whatever has queued up every VOTE_FLUSH_INTERVAL seconds, up to
+VOTE_FLUSH_BATCH_SIZE votes per transaction. On SQLite every commit is an
+fsync, so that turns hundreds of commits into one. The trade-offs: votes
+queued in a process that dies before its next flush are lost, and a vote that
+fails at flush time (say, for a user deleted in the meantime) is logged and
+dropped rather than reported to the client. The projected tallies include the
+votes queued in the answering process but not those queued in other workers.
+"""
+import atexit
+import logging
+import threading
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.dialects import postgresql, sqlite
+
+from cache import feed_cache
+from config import app, db
+from models import Article, Vote, VOTABLE_MODELS, get_utc_now
+from tasks import mark_dirty, score_recompute_deferred
+
+logger = logging.getLogger(__name__)
+
+
+def votable_article_id(votable_model, votable_id):
+    """The id of the article whose page shows this votable, as a value or SQL expression."""
+    if votable_model is Article:
+        return votable_id
+    return db.select(votable_model.article_id).where(votable_model.id == votable_id).scalar_subquery()
+
+
+def _vote_filter(user_id, votable_type, votable_id):
+    return (
+        (Vote.user_id == user_id)
+        & (Vote.votable_type == votable_type)
+        & (Vote.votable_id == votable_id)
+    )
+
+
+def _upsert_vote(user_id, votable_type, votable_id, value):
+    """Insert or update the vote row and return the value it replaced."""
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return _upsert_vote_postgresql(user_id, votable_type, votable_id, value)
+    return _upsert_vote_sqlite(user_id, votable_type, votable_id, value)
+
+
+def _new_vote(insert, user_id, votable_type, votable_id, value):
+    return insert(Vote).values(
+        user_id=user_id,
+        votable_type=votable_type,
+        votable_id=votable_id,
+        value=value,
+        created_at=get_utc_now(),
+    )
+
+
+def _upsert_vote_postgresql(user_id, votable_type, votable_id, value):
+    statement = _new_vote(postgresql.insert, user_id, votable_type, votable_id, value)
+    statement = statement.on_conflict_do_update(
+        index_elements=[Vote.user_id, Vote.votable_type, Vote.votable_id],
+        set_={"value": statement.excluded.value},
+        # Re-sending the same vote leaves the row alone and returns nothing
+        where=Vote.value != statement.excluded.value,
+    ).returning(
+        # xmax is 0 on a row this statement inserted and set on one it updated
+        db.literal_column('xmax = 0', db.Boolean).label('inserted')
+    )
+
+    row = db.session.execute(statement).first()
+    if row is None:
+        return value
+    # Values are only ever -1 or 1, so an updated row held the opposite
+    return 0 if row.inserted else -value
+
+
+def _upsert_vote_sqlite(user_id, votable_type, votable_id, value):
+    inserted = db.session.execute(
+        _new_vote(sqlite.insert, user_id, votable_type, votable_id, value)
+        .on_conflict_do_nothing(index_elements=[Vote.user_id, Vote.votable_type, Vote.votable_id])
+        .returning(Vote.id)
+    ).first()
+    if inserted is not None:
+        return 0
+
+    # The INSERT started a write transaction, so the existing vote can't change under us now
+    flipped = db.session.execute(
+        db.update(Vote)
+        .where(_vote_filter(user_id, votable_type, votable_id) & (Vote.value != value))
+        .values(value=value)
+        .returning(Vote.id)
+    ).first()
+    # Nothing updated: the same vote was already there
+    return -value if flipped is not None else value
+
+
+def _delete_vote(user_id, votable_type, votable_id):
+    """Delete the vote row and return the value it had."""
+    previous = db.session.execute(
+        db.delete(Vote)
+        .where(_vote_filter(user_id, votable_type, votable_id))
+        .returning(Vote.value)
+    ).scalar()
+    return previous or 0
+
+
+def record_vote(user_id, votable_type, votable_id, value, refresh_hotness=True):
+    """
+    Store a vote (value 0 removes it) and move the votable's counters to match.
+    Returns (previous_value, (like_count, dislike_count)); the tallies are None if
+    the votable doesn't exist. The caller commits.
+    """
+    votable_model = VOTABLE_MODELS[votable_type]
+    if value == 0:
+        previous_value = _delete_vote(user_id, votable_type, votable_id)
+    else:
+        previous_value = _upsert_vote(user_id, votable_type, votable_id, value)
+
+    counts = votable_model.apply_vote(votable_id, previous_value, value, refresh_hotness=refresh_hotness)
+    if previous_value != value:
+        Article.touch(Article.id == votable_article_id(votable_model, votable_id))
+    return previous_value, counts
+
+
+def projected_vote_counts(user_id, votable_type, votable_id, value, pending=None):
+    """
+    Tallies as they will be once the queued votes are written: the stored
+    counters shifted, for this user and every user in pending (user_id -> value,
+    the other votes queued for this votable), by the difference between their
+    stored vote and the queued one. Votes queued in other processes aren't
+    counted. Returns None if the votable doesn't exist.
+    """
+    votable_model = VOTABLE_MODELS[votable_type]
+    row = db.session.execute(
+        db.select(votable_model.like_count, votable_model.dislike_count)
+        .where(votable_model.id == votable_id)
+    ).first()
+    if row is None:
+        return None
+
+    queued = {**(pending or {}), user_id: value}
+    stored = dict(db.session.execute(
+        db.select(Vote.user_id, Vote.value)
+        .where(Vote.votable_type == votable_type, Vote.votable_id == votable_id, Vote.user_id.in_(queued))
+    ).all())
+    like_count, dislike_count = row
+    for voter, queued_value in queued.items():
+        previous_value = stored.get(voter, 0)
+        like_count += (queued_value == 1) - (previous_value == 1)
+        dislike_count += (queued_value == -1) - (previous_value == -1)
+    return like_count, dislike_count
+
+
+def after_vote_commit(changed):
+    """Side effects of committed votes: changed is a set of (votable_type, votable_id)."""
+    if not changed:
+        return
+    feed_cache.invalidate()
+    if score_recompute_deferred():
+        for votable_type, votable_id in changed:
+            try:
+                mark_dirty(votable_type, votable_id)
+            except Exception:
+                # The vote is committed, so don't fail it; a later vote schedules the recompute
+                logger.exception("Could not schedule a score recompute for %s %s", votable_type, votable_id)
+
+
+class VoteBuffer:
+    """
+    Pending votes keyed by (user_id, votable_type, votable_id). A later vote for
+    the same key replaces the queued one, so a user flipping a vote back and
+    forth between flushes costs one write.
+    """
+
+    def __init__(self, interval=0.5, batch_size=500):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.flushed = 0
+        self.dropped = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, user_id, votable_type, votable_id, value):
+        with self._lock:
+            self._pending[(user_id, votable_type, votable_id)] = value
+            full = len(self._pending) >= self.batch_size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="vote-flusher", daemon=True)
+                self._thread.start()
+        if full:
+            self._wakeup.set()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def pending_for(self, votable_type, votable_id):
+        """The votes queued for one votable, as user_id -> value."""
+        with self._lock:
+            return {
+                user_id: value
+                for (user_id, pending_type, pending_id), value in self._pending.items()
+                if pending_type == votable_type and pending_id == votable_id
+            }
+
+    def _take(self):
+        with self._lock:
+            keys = list(self._pending)[:self.batch_size]
+            return [(*key, self._pending.pop(key)) for key in keys]
+
+    def flush(self):
+        """Write everything queued so far. Returns the number of votes written."""
+        written = 0
+        with app.app_context():
+            while True:
+                batch = self._take()
+                if not batch:
+                    break
+                written += self._write_batch(batch)
+        self.flushed += written
+        return written
+
+    def _write_batch(self, batch):
+        deferred = score_recompute_deferred()
+        try:
+            changed = self._record(batch, deferred)
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            # One bad row (a deleted user, a bad id) shouldn't cost the whole batch
+            return self._write_rows(batch, deferred)
+        finally:
+            db.session.remove()
+        after_vote_commit(changed)
+        return len(batch)
+
+    def _write_rows(self, batch, deferred):
+        written = 0
+        for vote in batch:
+            try:
+                changed = self._record([vote], deferred)
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                self.dropped += 1
+                logger.exception("Dropping queued vote %r", vote)
+                continue
+            after_vote_commit(changed)
+            written += 1
+        return written
+
+    def _record(self, batch, deferred):
+        changed = set()
+        for user_id, votable_type, votable_id, value in batch:
+            previous_value, _ = record_vote(user_id, votable_type, votable_id, value, refresh_hotness=False)
+            if previous_value != value:
+                changed.add((votable_type, votable_id))
+
+        # One hot_score pass for the batch instead of one per vote
+        article_ids = [votable_id for votable_type, votable_id in changed if votable_type == 'Article']
+        if article_ids and not deferred:
+            Article.refresh_hot_scores(article_ids)
+        return changed
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Vote flush failed")
+
+
+def write_behind_enabled():
+    return app.config['VOTE_WRITE_BEHIND']
+
+
+vote_buffer = VoteBuffer(
+    interval=app.config['VOTE_FLUSH_INTERVAL'],
+    batch_size=app.config['VOTE_FLUSH_BATCH_SIZE'],
+)
+
+# Don't lose the queue on a clean shutdown
+atexit.register(vote_buffer.flush)